@@ -85,6 +85,7 @@ function Renderer(container, context) {
         imageType = _imageType;
         image = _image;
         globalParams = params || {};
+        archiveIndexes = {};
 
         // Clear old data
         if (program) {
@@ -308,7 +309,33 @@ function Renderer(container, context) {
         } else {
             image.fullpath = image.path;
         }
+        if (image.archivePath)
+            image.archiveFullpath = image.basePath ? image.basePath + image.archivePath : image.archivePath;
+
+        // Parse table of deduplicated tiles, if it exists
+        if (image.tileAliases) {
+            var aliasDigits = shtB83decode(image.tileAliases.at(0), 1)[0],
+                aliasPairs = shtB83decode(image.tileAliases.slice(1), aliasDigits);
+            image.tileAliasMap = {};
+            for (var aliasIndex = 0; aliasIndex < aliasPairs.length; aliasIndex += 2)
+                image.tileAliasMap[aliasPairs[aliasIndex]] = aliasPairs[aliasIndex + 1];
+            image.tileAliasOffsets = [];
+            image.tileAliasTiles = [];
+            var aliasOffset = 0;
+            for (var aliasLevel = 1; aliasLevel <= image.maxLevel; aliasLevel++) {
+                var aliasTiles = Math.ceil(Math.floor(image.cubeResolution /
+                    Math.pow(2, image.maxLevel - aliasLevel)) / image.tileResolution);
+                image.tileAliasOffsets[aliasLevel] = aliasOffset;
+                image.tileAliasTiles[aliasLevel] = aliasTiles;
+                aliasOffset += 6 * aliasTiles * aliasTiles;
+            }
+        }
         image.invTileResolution = 1 / image.tileResolution;
+
+        // Start loading the tiles of the initial view, if they're listed,
+        // instead of waiting for the viewer to request them one per frame
+        if (image.prefetch)
+            prefetchTiles(image.prefetch);
         
         var vertices = createCube();
         vtmps = [];
@@ -968,7 +995,7 @@ function Renderer(container, context) {
                     if (!node.texture && !node.textureLoad) {
                         node.textureLoad = true;
             
-                        setTimeout(processNextTile, 0, node);
+                        setTimeout(image.archivePath ? processNextArchiveTile : processNextTile, 0, node);
                         
                         // Only process one tile per frame to improve responsiveness
                         break;
@@ -1138,11 +1165,43 @@ function Renderer(container, context) {
         this.level = level;
         this.x = x;
         this.y = y;
+        this.path = multiresTilePath(path, side, level, x, y);
+        this.parentPath = parentPath;
+        // Deduplicated tiles use the file of an identical tile, but the node
+        // path still identifies the node
+        this.src = this.path;
+        if (image.tileAliasMap !== undefined) {
+            var tiles = image.tileAliasTiles[level],
+                shared = image.tileAliasMap[image.tileAliasOffsets[level] + (sides.indexOf(side) * tiles + y) * tiles + x];
+            if (shared !== undefined) {
+                // Find position of identical tile, which can be on any level
+                var sharedLevel = 1;
+                while (sharedLevel < image.maxLevel && shared >= image.tileAliasOffsets[sharedLevel + 1])
+                    sharedLevel++;
+                tiles = image.tileAliasTiles[sharedLevel];
+                shared -= image.tileAliasOffsets[sharedLevel];
+                this.src = multiresTilePath(path, sides[Math.floor(shared / (tiles * tiles))], sharedLevel,
+                    shared % tiles, Math.floor(shared / tiles) % tiles);
+            }
+        }
+    }
+
+    /**
+     * Formats the path of a multires tile.
+     * @private
+     * @param {string|Object} path - Path format, or dictionary of paths with
+     *      a `tileKey` format entry.
+     * @param {string} side - Cube face.
+     * @param {number} level - Zoom level.
+     * @param {number} x - Tile column.
+     * @param {number} y - Tile row.
+     * @returns {string} Tile path.
+     */
+    function multiresTilePath(path, side, level, x, y) {
         // Use tile key if paths need to be looked up in a dictionary, which needs a `tileKey` entry
         var p = typeof path === 'object' ? path.tileKey : path;
         p = p.replace('%s',side).replace('%l0',level-1).replace('%l',level).replace('%x',x).replace('%y',y);
-        this.path = typeof path === 'object' ? path[p] : p;
-        this.parentPath = parentPath;
+        return typeof path === 'object' ? path[p] : p;
     }
 
     /**
@@ -1491,6 +1550,7 @@ function Renderer(container, context) {
     }
     
     var pendingTextureRequests = [];
+    var archiveIndexes = {};
 
     // Based on http://blog.tojicode.com/2012/03/javascript-memory-optimization-and.html
     var loadTexture = (function() {
@@ -1560,23 +1620,28 @@ function Renderer(container, context) {
      * @param {MultiresNode} node - Input node.
      */
     function processNextTileFallback(node) {
-        loadTexture(node, node.path + (image.extension ? '.' + image.extension : ''), function(texture, loaded) {
+        loadTexture(node, node.src + (image.extension ? '.' + image.extension : ''), function(texture, loaded) {
             node.texture = texture;
             node.textureLoaded = loaded ? 2 : 1;
         }, globalParams.crossOrigin);
     }
 
     // Load images in separate thread when possible
-    var processNextTile;
+    var processNextTile, requestArchiveTile;
     if (window.Worker && window.createImageBitmap) {
         function workerFunc() {
             self.onmessage = function(e) {
                 var path = e.data[0],
-                    crossOrigin = e.data[1];
+                    crossOrigin = e.data[1],
+                    range = e.data[2];
                 fetch(path, {
                     mode: 'cors',
-                    credentials: crossOrigin == 'use-credentials' ? 'include' : 'same-origin'
+                    credentials: crossOrigin == 'use-credentials' ? 'include' : 'same-origin',
+                    headers: range ? {'Range': range} : {}
                 }).then(function(response) {
+                    // Make sure only the requested tile was returned from a tile archive
+                    if (range && response.status != 206)
+                        throw new Error(response.status);
                     return response.blob();
                 }).then(function(blob) {
                     return createImageBitmap(blob);
@@ -1595,29 +1660,133 @@ function Renderer(container, context) {
                 success = e.data[1],
                 bitmap = e.data[2];
             program.textureLoads.push(function(execute) {
-                var texture,
-                    loaded = false;
-                if (success && execute) { // Ignore missing tile to support partial image
-                    texture = gl.createTexture();
-                    processLoadedTexture(bitmap, texture);
-                    loaded = true;
-                }
-                var node = texturesLoading[path];
+                // Identical, deduplicated tiles share a single request
+                var nodes = texturesLoading[path] || [];
                 delete texturesLoading[path];
-                if (node !== undefined) {
-                    node.texture = texture;
-                    node.textureLoaded = loaded ? 2 : 1;
+                for (var i = 0; i < nodes.length; i++) {
+                    if (success && execute) { // Ignore missing tile to support partial image
+                        nodes[i].texture = gl.createTexture();
+                        processLoadedTexture(bitmap, nodes[i].texture);
+                        nodes[i].textureLoaded = 2;
+                    } else {
+                        nodes[i].texture = undefined;
+                        nodes[i].textureLoaded = 1;
+                    }
                 }
             });
         };
+        var requestTile = function(node, path, range) {
+            if (texturesLoading[path] !== undefined) {
+                texturesLoading[path].push(node);
+                return;
+            }
+            texturesLoading[path] = [node];
+            worker.postMessage([path, globalParams.crossOrigin, range]);
+        };
         processNextTile = function(node) {
             // Since web worker is created from a Blob, we need the absolute URL
-            var path = new URL(node.path + (image.extension ? '.' + image.extension : ''), window.location).href;
-            texturesLoading[path] = node;
-            worker.postMessage([path, globalParams.crossOrigin]);
+            requestTile(node, new URL(node.src + (image.extension ? '.' + image.extension : ''), window.location).href);
+        };
+        requestArchiveTile = function(node, path, range) {
+            // Fragment keeps path unique for each tile but isn't sent to server
+            requestTile(node, new URL(path, window.location).href + '#' + range, range);
         };
     } else {
         processNextTile = processNextTileFallback;
+        requestArchiveTile = function(node, path, range) {
+            fetch(path, {
+                credentials: globalParams.crossOrigin == 'use-credentials' ? 'include' : 'same-origin',
+                headers: {'Range': range}
+            }).then(function(response) {
+                if (response.status != 206)
+                    throw new Error(response.status);
+                return response.blob();
+            }).then(function(blob) {
+                var url = URL.createObjectURL(blob);
+                loadTexture(node, url, function(texture, loaded) {
+                    URL.revokeObjectURL(url);
+                    node.texture = texture;
+                    node.textureLoaded = loaded ? 2 : 1;
+                }, globalParams.crossOrigin);
+            }).catch(function() {
+                node.textureLoaded = 1; // Ignore missing tile
+            });
+        };
+    }
+
+    /**
+     * Starts loading tiles before they're requested by the renderer, so that
+     * they're in the browser's cache when they are. For packed tile archives,
+     * whose tiles are loaded with range requests, only the indexes of the
+     * tiles' levels are loaded.
+     * @private
+     * @param {Array} tiles - Tiles to load, each given as a cube face, zoom
+     *      level, x index, and y index.
+     */
+    function prefetchTiles(tiles) {
+        var requested = {};
+        for (var i = 0; i < tiles.length; i++) {
+            if (image.archivePath) {
+                loadArchiveIndex(tiles[i][1]).catch(function() {});
+                continue;
+            }
+            var node = new MultiresNode(null, tiles[i][0], tiles[i][1], tiles[i][2], tiles[i][3], image.fullpath, null),
+                path = new URL(node.src + (image.extension ? '.' + image.extension : ''), window.location).href;
+            if (requested[path])
+                continue;  // Identical, deduplicated tile
+            requested[path] = true;
+            fetch(path, {
+                mode: 'cors',
+                credentials: globalParams.crossOrigin == 'use-credentials' ? 'include' : 'same-origin'
+            }).catch(function() {});
+        }
+    }
+
+    /**
+     * Loads the index of a packed tile archive for a zoom level, which
+     * contains the number of tiles along each side of a cube face followed by
+     * the length of each tile, in face, row, column order.
+     * @private
+     * @param {number} level - Zoom level.
+     * @returns {Promise} Resolves to the archive's path, the number of tiles
+     *      along each side of a cube face, and the offset of each tile.
+     */
+    function loadArchiveIndex(level) {
+        if (!archiveIndexes.hasOwnProperty(level)) {
+            var path = image.archiveFullpath.replace('%l', level);
+            archiveIndexes[level] = fetch(path + '.idx', {
+                credentials: globalParams.crossOrigin == 'use-credentials' ? 'include' : 'same-origin'
+            }).then(function(response) {
+                if (!response.ok)
+                    throw new Error(response.status);
+                return response.arrayBuffer();
+            }).then(function(buffer) {
+                var data = new DataView(buffer),
+                    offsets = new Float64Array(buffer.byteLength / 4);
+                for (var i = 1; i < offsets.length; i++)
+                    offsets[i] = offsets[i - 1] + data.getUint32(i * 4, true);
+                return {path: path + '.pack', tiles: data.getUint32(0, true), offsets: offsets};
+            });
+        }
+        return archiveIndexes[level];
+    }
+
+    /**
+     * Loads image from a packed tile archive, using an HTTP range request, and
+     * creates texture for a multires node / tile.
+     * @private
+     * @param {MultiresNode} node - Input node.
+     */
+    function processNextArchiveTile(node) {
+        loadArchiveIndex(node.level).then(function(index) {
+            var i = (sides.indexOf(node.side) * index.tiles + node.y) * index.tiles + node.x;
+            if (index.offsets[i + 1] > index.offsets[i])
+                requestArchiveTile(node, index.path, 'bytes=' + index.offsets[i] + '-' + (index.offsets[i + 1] - 1));
+            else
+                node.textureLoaded = 1; // Ignore missing tile to support partial image
+        }).catch(function() {
+            node.textureLoaded = 1;
+        });
     }
     
     /**
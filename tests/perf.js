@@ -0,0 +1,199 @@
+/*
+ * Instrumentation for the performance mode of run_tests.py
+ *
+ * When tests.html is loaded with a "perf" query string, this records frame
+ * times with requestAnimationFrame, viewer events, and when each tile is
+ * requested and uploaded to a WebGL texture, and makes the Resource Timing
+ * entries of both the page and the viewer's tile-loading worker available.
+ * It must be loaded before libpannellum.js.
+ */
+
+(function() {
+'use strict';
+
+if (!/[?&]perf\b/.test(window.location.search))
+    return;
+
+var quietTime = 500,    // Time without tile activity before a step is done
+    maxWait = 15000,    // Maximum time to wait for tiles to finish loading
+    bufferSize = 10000; // Resource Timing entries to keep
+
+var frames = null,
+    lastFrame,
+    events = [],
+    uploads = [],
+    pending = 0,
+    lastActivity = 0,
+    workers = [],
+    bitmapUrls = new WeakMap();
+
+performance.setResourceTimingBufferSize(bufferSize);
+
+function activity() {
+    lastActivity = performance.now();
+}
+
+// Wrap the tile-loading worker's script so it can report its own Resource
+// Timing entries, since fetches made in a worker aren't in the page's
+// performance timeline, and track tile requests and responses
+var NativeWorker = window.Worker;
+if (NativeWorker) {
+    window.Worker = function(url, options) {
+        var wrapper = new Blob([
+            'performance.setResourceTimingBufferSize(' + bufferSize + ');\n' +
+            'self.addEventListener("message", function(e) {\n' +
+            '    if (e.data == "pannellumPerf") {\n' +
+            '        e.stopImmediatePropagation();\n' +
+            '        postMessage(["pannellumPerf", performance.timeOrigin,\n' +
+            '            performance.getEntriesByType("resource").map(function(r) { return r.toJSON(); })]);\n' +
+            '    }\n' +
+            '});\n' +
+            'importScripts(' + JSON.stringify(url) + ');\n'
+        ], {type: 'application/javascript'});
+        var worker = new NativeWorker(URL.createObjectURL(wrapper), options),
+            postMessage = worker.postMessage;
+        worker.postMessage = function(message) {
+            if (message != 'pannellumPerf') {
+                pending++;
+                activity();
+            }
+            return postMessage.apply(worker, arguments);
+        };
+        // Registered before the viewer sets onmessage, so it's called first
+        worker.addEventListener('message', function(e) {
+            if (e.data[0] == 'pannellumPerf') {
+                e.stopImmediatePropagation();
+                worker.perfCallback(e.data[1], e.data[2]);
+                return;
+            }
+            pending--;
+            activity();
+            if (e.data[2])
+                bitmapUrls.set(e.data[2], e.data[0]);
+        });
+        workers.push(worker);
+        return worker;
+    };
+}
+
+// Record when images are uploaded to textures
+function hookTexImage2D(proto) {
+    var texImage2D = proto.texImage2D;
+    proto.texImage2D = function() {
+        var source = arguments[arguments.length - 1],
+            url;
+        if (source instanceof HTMLImageElement)
+            url = source.src;
+        else if (window.ImageBitmap && source instanceof ImageBitmap)
+            url = bitmapUrls.get(source);
+        var result = texImage2D.apply(this, arguments);
+        if (url) {
+            uploads.push({url: url, time: performance.now()});
+            activity();
+        }
+        return result;
+    };
+}
+if (window.WebGLRenderingContext)
+    hookTexImage2D(WebGLRenderingContext.prototype);
+if (window.WebGL2RenderingContext)
+    hookTexImage2D(WebGL2RenderingContext.prototype);
+
+function recordFrame(time) {
+    if (frames === null)
+        return;
+    if (lastFrame !== undefined)
+        frames.push(time - lastFrame);
+    lastFrame = time;
+    requestAnimationFrame(recordFrame);
+}
+
+function whenIdle(callback) {
+    var start = performance.now();
+    (function check() {
+        var now = performance.now();
+        if ((pending <= 0 && now - lastActivity >= quietTime) || now - start >= maxWait)
+            callback();
+        else
+            setTimeout(check, 50);
+    })();
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    ['load', 'scenechange', 'error'].forEach(function(type) {
+        window.viewer.on(type, function() {
+            events.push({type: type, scene: window.viewer.getScene(), time: performance.now()});
+        });
+    });
+});
+
+window.pannellumPerf = {
+    /**
+     * Call action(done), which starts a camera movement or scene change and
+     * calls done() once it's finished, while recording frame times. Once
+     * done() is called and tiles have stopped loading, callback() is called
+     * with the step's start and end times and frame times.
+     */
+    measure: function(action, callback) {
+        var start = performance.now();
+        frames = [];
+        lastFrame = undefined;
+        activity();
+        requestAnimationFrame(recordFrame);
+        action(function() {
+            activity();
+            whenIdle(function() {
+                var result = {start: start, end: performance.now(), frames: frames};
+                frames = null;
+                callback(result);
+            });
+        });
+    },
+
+    /**
+     * Call callback() once the given event has been fired after the given
+     * time.
+     */
+    waitFor: function(type, since, callback) {
+        (function check() {
+            for (var i = 0; i < events.length; i++) {
+                if (events[i].type == type && events[i].time >= since) {
+                    callback();
+                    return;
+                }
+            }
+            setTimeout(check, 20);
+        })();
+    },
+
+    /**
+     * Call callback() with the recorded events, texture uploads, and Resource
+     * Timing entries, with those of workers converted to the page's time
+     * origin.
+     */
+    collect: function(callback) {
+        var resources = performance.getEntriesByType('resource').map(function(r) { return r.toJSON(); }),
+            remaining = workers.length;
+        function finish() {
+            callback({events: events, uploads: uploads, resources: resources});
+        }
+        if (remaining === 0)
+            finish();
+        workers.forEach(function(worker) {
+            worker.perfCallback = function(timeOrigin, entries) {
+                var offset = timeOrigin - performance.timeOrigin;
+                entries.forEach(function(r) {
+                    for (var key in r)
+                        if (typeof r[key] == 'number' && /(Start|End|startTime)$/.test(key) && r[key] > 0)
+                            r[key] += offset;
+                    resources.push(r);
+                });
+                if (--remaining === 0)
+                    finish();
+            };
+            worker.postMessage('pannellumPerf');
+        });
+    }
+};
+
+})();
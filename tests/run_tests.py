@@ -18,6 +18,7 @@ from http.server import SimpleHTTPRequestHandler
 from socketserver import TCPServer
 import argparse
 import io
+import json
 import os
 import re
 import subprocess
@@ -30,6 +31,99 @@ from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 
+# Scenes of tests.html visited by the performance tests, in order
+PERF_SCENES = ["equirectangular", "cube", "multires"]
+
+# Camera movements made in each scene by the performance tests; the JavaScript
+# of each step starts a movement and calls done() once it's finished
+PERF_MOVES = [
+    ("pan", "viewer.setYaw(viewer.getYaw() + 170, 2000, done)"),
+    ("pan back", "viewer.setYaw(viewer.getYaw() - 170, 2000, done)"),
+    ("tilt", "viewer.setPitch(40, 1000, done)"),
+    ("zoom in", "viewer.setHfov(50, 1500, done)"),
+    ("zoom out", "viewer.setHfov(110, 1500, done)"),
+    ("look at", "viewer.lookAt(-20, viewer.getYaw() - 90, 90, 2000, done)"),
+]
+
+# Frames that take longer than this (in ms) are counted as long frames
+LONG_FRAME = 50
+
+
+def summarize(values):
+    """Summarize a list of times in ms, or return None if it's empty.
+    """
+    if len(values) == 0:
+        return None
+    values = np.array(values, dtype=float)
+    return {
+        "count": len(values),
+        "mean": round(float(np.mean(values)), 2),
+        "median": round(float(np.median(values)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(np.max(values)), 2),
+    }
+
+
+def match_tiles(resources, uploads, origin):
+    """Match Resource Timing entries of images to the texture uploads of the
+    same URL that follow them, returning a list of tiles with their fetch
+    times and their latencies from the start of the request to the upload.
+    """
+    pending = {}
+    for upload in sorted(uploads, key=lambda u: u["time"]):
+        pending.setdefault(upload["url"], []).append(upload["time"])
+    tiles = []
+    for entry in sorted(resources, key=lambda r: r["startTime"]):
+        times = pending.get(entry["name"], [])
+        while len(times) > 0 and times[0] < entry["startTime"]:
+            times.pop(0)
+        if len(times) == 0:
+            continue
+        uploaded = times.pop(0)
+        end = entry["responseEnd"] or entry["startTime"] + entry["duration"]
+        tiles.append(
+            {
+                "url": entry["name"][len(origin):]
+                if entry["name"].startswith(origin)
+                else entry["name"],
+                "start_ms": round(entry["startTime"], 2),
+                "fetch_ms": round(end - entry["startTime"], 2),
+                "latency_ms": round(uploaded - entry["startTime"], 2),
+                "transfer_size": entry.get("transferSize", 0),
+            }
+        )
+    return tiles
+
+
+def compare_performance(report, baseline, tolerance):
+    """Compare the summary of a performance report to that of a baseline
+    report, raising an error if any time increased by more than the given
+    fraction.
+    """
+    metrics = [
+        ("first render " + scene, ["first_render_ms", scene])
+        for scene in PERF_SCENES
+    ]
+    for key in ["frame_ms", "tile_fetch_ms", "tile_latency_ms"]:
+        for stat in ["median", "p95"]:
+            metrics.append(("%s %s" % (key, stat), [key, stat]))
+
+    regressions = []
+    for name, keys in metrics:
+        old, new = baseline["summary"], report["summary"]
+        for key in keys:
+            old = old.get(key) if old else None
+            new = new.get(key) if new else None
+        if not old or new is None:
+            continue
+        change = new / old - 1
+        print("%s: %.2f -> %.2f ms (%+.0f%%)" % (name, old, new, change * 100))
+        if change > tolerance:
+            regressions.append(name)
+    if regressions:
+        raise ValueError("Performance regression: " + ", ".join(regressions))
+
 
 class PannellumServer(SimpleHTTPRequestHandler):
     """Here we subclass SimpleHTTPServer to capture error messages.
@@ -199,6 +293,111 @@ class PannellumTester(object):
 
         self.httpd.server_close()
 
+    def measure_step(self, scene, name, script):
+        """Run a step of the performance tests, which calls done() once it's
+        finished, recording frame times until tiles stop loading.
+        """
+        step = self.browser.execute_async_script(
+            "var callback = arguments[arguments.length - 1];"
+            "pannellumPerf.measure(function(done) { %s; }, callback);" % script
+        )
+        assert self.browser.execute_script("return viewer.getScene()") == scene
+        step.update(scene=scene, name=name)
+        frames = summarize(step["frames"])
+        print(
+            "%s %s: %d frames, median %s ms"
+            % (scene, name, len(step["frames"]), frames and frames["median"])
+        )
+        return step
+
+    def run_performance(self, report_path, baseline_path=None, tolerance=0.25):
+        """Measure frame times, time to first render, and tile latency while
+        moving the camera and switching scenes, and write a JSON report.
+        """
+
+        print("Loading page...")
+        self.get_page("http://localhost:%s/tests/tests.html?perf" % self.port)
+        self.browser.set_script_timeout(120)
+        self.browser.execute_async_script(
+            "pannellumPerf.waitFor('load', 0, arguments[arguments.length - 1])"
+        )
+
+        print("Running performance tests...")
+        steps = []
+        for i, scene in enumerate(PERF_SCENES):
+            if i > 0:
+                steps.append(
+                    self.measure_step(
+                        scene,
+                        "load",
+                        "var since = performance.now(); viewer.loadScene(%s); "
+                        "pannellumPerf.waitFor('load', since, done)"
+                        % json.dumps(scene),
+                    )
+                )
+            for name, script in PERF_MOVES:
+                steps.append(self.measure_step(scene, name, script))
+
+        data = self.browser.execute_async_script(
+            "pannellumPerf.collect(arguments[arguments.length - 1])"
+        )
+        origin = "http://localhost:%s" % self.port
+        tiles = match_tiles(data["resources"], data["uploads"], origin)
+        loads = [e for e in data["events"] if e["type"] == "load"]
+
+        # The first scene is loaded with the page, so its time to first render
+        # is measured from the start of navigation
+        first_render = {PERF_SCENES[0]: round(loads[0]["time"], 2)}
+        step_reports = []
+        for step in steps:
+            step_tiles = [
+                t for t in tiles if step["start"] <= t["start_ms"] < step["end"]
+            ]
+            step_report = {
+                "scene": step["scene"],
+                "name": step["name"],
+                "duration_ms": round(step["end"] - step["start"], 2),
+                "frame_ms": summarize(step["frames"]),
+                "long_frames": sum(1 for f in step["frames"] if f > LONG_FRAME),
+                "tiles": len(step_tiles),
+                "tile_latency_ms": summarize([t["latency_ms"] for t in step_tiles]),
+            }
+            if step["name"] == "load":
+                load = [e for e in loads if e["time"] >= step["start"]][0]
+                first_render[step["scene"]] = round(load["time"] - step["start"], 2)
+                step_report["first_render_ms"] = first_render[step["scene"]]
+            step_reports.append(step_report)
+            for t in step_tiles:
+                t.update(scene=step["scene"], step=step["name"])
+        for t in tiles:
+            if "scene" not in t:
+                t.update(scene=PERF_SCENES[0], step="load")
+
+        frames = [f for step in steps for f in step["frames"]]
+        report = {
+            "browser": self.driver,
+            "user_agent": self.browser.execute_script("return navigator.userAgent"),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "summary": {
+                "first_render_ms": first_render,
+                "frame_ms": summarize(frames),
+                "long_frames": sum(1 for f in frames if f > LONG_FRAME),
+                "tile_fetch_ms": summarize([t["fetch_ms"] for t in tiles]),
+                "tile_latency_ms": summarize([t["latency_ms"] for t in tiles]),
+            },
+            "steps": step_reports,
+            "tiles": tiles,
+        }
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Wrote performance report to %s" % report_path)
+
+        if baseline_path is not None:
+            with open(baseline_path) as f:
+                compare_performance(report, json.load(f), tolerance)
+
+        self.httpd.server_close()
+
     def get_browser(self, name=None):
         """Return a browser if it hasn't been initialized yet.
         """
@@ -284,6 +483,34 @@ def get_parser():
         type=str,
         default="Chrome",
     )
+
+    parser.add_argument(
+        "--perf",
+        dest="perf",
+        metavar="REPORT",
+        help="Instead of the screenshot tests, run the performance tests "
+        "and write the results to a JSON report",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--perf-baseline",
+        dest="perf_baseline",
+        metavar="REPORT",
+        help="Performance report to compare the results to, failing if "
+        "any time increased by more than the tolerance",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--perf-tolerance",
+        dest="perf_tolerance",
+        help="Allowed fractional increase of times over the baseline",
+        type=float,
+        default=0.25,
+    )
     return parser
 
 
@@ -295,6 +522,11 @@ def main():
     except:
         sys.exit(0)
 
+    # Report paths are relative to the working directory
+    for key in ["perf", "perf_baseline"]:
+        if getattr(args, key) is not None:
+            setattr(args, key, os.path.abspath(getattr(args, key)))
+
     # Add this script's directory, in case it contains driver binaries
     here = os.path.abspath(os.path.dirname(__file__))
     os.environ["PATH"] = here + ":" + os.environ["PATH"]
@@ -309,7 +541,10 @@ def main():
     )
 
     # Run tests
-    tester.run_tests(create_ref=args.create_ref)
+    if args.perf is not None:
+        tester.run_performance(args.perf, args.perf_baseline, args.perf_tolerance)
+    else:
+        tester.run_tests(create_ref=args.create_ref)
 
     # Clean up shop!
     tester.stop()
@@ -2,9 +2,19 @@
 
 import os
 import tempfile
-import sys
 import subprocess
 import urllib.parse
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import concurrent.futures
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Brotli variants are only written if the brotli package is installed
 
 JS = [
 'js/libpannellum.js',
@@ -31,44 +41,88 @@ def read(filename):
         return f.read()
 
 def output(text, filename):
-    with open(os.path.join('../..', 'build', filename), 'w') as f:
-        f.write(text)
-
-def JScompress(text):
+    '''
+    Write a build artifact, along with gzip and, if available, Brotli variants
+    at maximum compression, and return the size of each.
+    '''
+    data = text.encode('utf-8')
+    variants = [('', data), ('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for extension, variant in variants:
+        with open(os.path.join('../..', 'build', filename + extension), 'wb') as f:
+            f.write(variant)
+    return [len(variant) for extension, variant in variants]
+
+def hashedName(text, filename):
+    '''
+    Add a hash of an artifact's contents to its filename, e.g.,
+    pannellum.0123abcd.js, so it can be cached indefinitely.
+    '''
+    name, extension = os.path.splitext(filename)
+    return name + '.' + hashlib.sha256(text.encode('utf-8')).hexdigest()[:8] + extension
+
+def report(sizes):
+    print('=' * 40)
+    print('%-24s %9s %9s %9s' % ('Artifact', 'Raw', 'gzip', 'Brotli'))
+    for filename, size in sizes:
+        print('%-24s %9d %9d %9s' % (filename, size[0], size[1], size[2] if len(size) > 2 else '-'))
+    if brotli is None:
+        print('Install the brotli package to also write Brotli variants')
+
+# Compressor outputs are cached here, by a hash of their inputs
+cacheDir = '.cache'
+useCache = True
+
+jarHashes = {}
+jarLock = threading.Lock()
+
+def jarHash(jar):
+    with jarLock:
+        if jar not in jarHashes:
+            if os.path.exists(jar):
+                with open(jar, 'rb') as f:
+                    jarHashes[jar] = hashlib.sha256(f.read()).hexdigest()
+            else:
+                jarHashes[jar] = ''
+        return jarHashes[jar]
+
+def compress(jar, options, text):
+    '''
+    Run a Java compressor on text, with %(input)s and %(output)s in its
+    options replaced by temporary files, reusing the output of an earlier
+    run if the compressor, its options, and the text haven't changed.
+    '''
+    key = hashlib.sha256('\0'.join([jar, jarHash(jar), options, text]).encode('utf-8')).hexdigest()
+    cached = os.path.join(cacheDir, key)
+    if useCache and os.path.exists(cached):
+        with open(cached, 'r') as handle:
+            return handle.read()
     in_tuple = tempfile.mkstemp()
     with os.fdopen(in_tuple[0], 'w') as handle:
         handle.write(text)
     out_tuple = tempfile.mkstemp()
-    os.system("java -jar compiler.jar --language_in=ECMASCRIPT5 --warning_level=QUIET --js %s --js_output_file %s" % (in_tuple[1], out_tuple[1]))
+    status = os.system("java -jar %s " % jar + options % {'input': in_tuple[1], 'output': out_tuple[1]})
     with os.fdopen(out_tuple[0], 'r') as handle:
         compressed = handle.read()
     os.unlink(in_tuple[1])
     os.unlink(out_tuple[1])
+    if status == 0 and compressed:
+        # Written to a temporary file first, in case of concurrent builds
+        os.makedirs(cacheDir, exist_ok=True)
+        with open(cached + '.' + str(os.getpid()), 'w') as handle:
+            handle.write(compressed)
+        os.replace(cached + '.' + str(os.getpid()), cached)
     return compressed
 
+def JScompress(text):
+    return compress('compiler.jar', '--language_in=ECMASCRIPT5 --warning_level=QUIET --js %(input)s --js_output_file %(output)s', text)
+
 def cssCompress(text):
-    in_tuple = tempfile.mkstemp()
-    with os.fdopen(in_tuple[0], 'w') as handle:
-        handle.write(text)
-    out_tuple = tempfile.mkstemp()
-    os.system("java -jar yuicompressor-2.4.7.jar %s --type css -o %s --charset utf-8 -v" % (in_tuple[1], out_tuple[1]))
-    with os.fdopen(out_tuple[0], 'r') as handle:
-        compressed = handle.read()
-    os.unlink(in_tuple[1])
-    os.unlink(out_tuple[1])
-    return compressed
+    return compress('yuicompressor-2.4.7.jar', '%(input)s --type css -o %(output)s --charset utf-8 -v', text)
 
-def htmlCompress(text):    
-    in_tuple = tempfile.mkstemp()
-    with os.fdopen(in_tuple[0], 'w') as handle:
-        handle.write(text)
-    out_tuple = tempfile.mkstemp()
-    os.system("java -jar htmlcompressor-1.5.3.jar --remove-intertag-spaces --remove-quotes -o %s %s" % (out_tuple[1], in_tuple[1]))
-    with os.fdopen(out_tuple[0], 'r') as handle:
-        compressed = handle.read()
-    os.unlink(in_tuple[1])
-    os.unlink(out_tuple[1])
-    return compressed
+def htmlCompress(text):
+    return compress('htmlcompressor-1.5.3.jar', '--remove-intertag-spaces --remove-quotes -o %(output)s %(input)s', text)
 
 def addHeaderHTML(text, version):
     text = text.replace('<!DOCTYPE HTML>','');
@@ -83,7 +137,7 @@ def addHeaderJS(text, version):
     header = '// Pannellum ' + version + ', https://github.com/mpetroff/pannellum\n'
     return header + text
 
-def build(files, css, html, filename, release=False):
+def build(files, css, html, filename, release=False, hashed=False):
     folder = ''
     os.makedirs('../../build', exist_ok=True)
     
@@ -92,9 +146,11 @@ def build(files, css, html, filename, release=False):
     filename = filename + '.js'
     
     print('=' * 40)
-    print('Compiling', filename)
+    print('Compiling', filename, 'and', cssfilename)
     print('=' * 40)
     
+    # Independent compressor runs are done concurrently
+    pool = concurrent.futures.ThreadPoolExecutor(4)
     js = merge(files)
     if release:
         version = read('../VERSION').strip()
@@ -107,23 +163,24 @@ def build(files, css, html, filename, release=False):
     js = js.replace('// VERSION PLACEHOLDER FOR BUILD', 'aboutMsgVersion.textContent = " ' + version + '";')
     with open('../../src/standalone/standalone.js', 'r') as f:
         standalone_js = f.read()
-    standalone_js = JScompress(js + standalone_js)
-    js = JScompress(js)
-    
-    print('=' * 40)
-    print('Compiling', cssfilename)
-    print('=' * 40)
+    standalone_js = pool.submit(JScompress, js + standalone_js)
+    js = pool.submit(JScompress, js)
     
     css = merge(css)
     css = css.replace("'img/grab.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/grab.svg'),'') + "'")
     css = css.replace("'img/grabbing.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/grabbing.svg'),'') + "'")
     with open('../../src/standalone/standalone.css', 'r') as f:
         standalone_css = f.read()
-    standalone_css = cssCompress(css + standalone_css)
+    standalone_css = pool.submit(cssCompress, css + standalone_css)
+    css = pool.submit(cssCompress, css)
+    standalone_js = standalone_js.result()
+    js = js.result()
+    standalone_css = standalone_css.result()
+    css = css.result()
+    pool.shutdown()
     standalone_css = standalone_css.replace("'img/sprites.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/sprites.svg'),'') + "'")
     standalone_css = standalone_css.replace("'img/background.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/background.svg'),'') + "'")
     standalone_css = standalone_css.replace("'img/compass.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/compass.svg'),'') + "'")
-    css = cssCompress(css)
     css = css.replace("'img/sprites.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/sprites.svg'),'') + "'")
     css = css.replace("'img/background.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/background.svg'),'') + "'")
     css = css.replace("'img/compass.svg'","'data:image/svg+xml," + urllib.parse.quote(read('css/img/compass.svg'),'') + "'")
@@ -140,16 +197,45 @@ def build(files, css, html, filename, release=False):
     html = html.replace('<link type="text/css" rel="Stylesheet" href="standalone.css"/>', '')
     html = htmlCompress(html)
     
-    output(addHeaderHTML(html, version), folder + htmlfilename)
-    output(addHeaderCSS(css, version), folder + cssfilename)
-    output(addHeaderJS(js, version), folder + filename)
+    artifacts = [
+        (htmlfilename, addHeaderHTML(html, version)),
+        (cssfilename, addHeaderCSS(css, version)),
+        (filename, addHeaderJS(js, version)),
+    ]
+    manifest = {}
+    manifestPath = os.path.join('../..', 'build', 'manifest.json')
+    if hashed and os.path.exists(manifestPath):
+        # Remove the hashed artifacts of the previous build
+        with open(manifestPath, 'r') as f:
+            for name in json.load(f).values():
+                for extension in ('', '.gz', '.br'):
+                    if os.path.exists(os.path.join('../..', 'build', name + extension)):
+                        os.remove(os.path.join('../..', 'build', name + extension))
+    sizes = []
+    for name, text in artifacts:
+        if hashed:
+            manifest[name] = hashedName(text, name)
+            name = manifest[name]
+        sizes.append((name, output(text, folder + name)))
+    if hashed:
+        # Maps each artifact's name to its content-hashed filename
+        with open(manifestPath, 'w') as f:
+            json.dump(manifest, f, indent=4)
+    report(sizes)
 
 def main():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))  # cd to script dir
-    if (len(sys.argv) > 1 and sys.argv[1] == 'release'):
-        build(JS, CSS, HTML, 'pannellum', True)
-    else:
-        build(JS, CSS, HTML, 'pannellum')
+    parser = argparse.ArgumentParser(description='Build minified Pannellum files.')
+    parser.add_argument('release', nargs='?', choices=['release'],
+                        help='use the version in VERSION instead of the Git revision')
+    parser.add_argument('--no-cache', dest='noCache', action='store_true',
+                        help='run every compressor, instead of reusing outputs cached in utils/build/.cache for unchanged inputs')
+    parser.add_argument('--hashed', action='store_true',
+                        help='add a hash of their contents to the filenames of the built files and list them in build/manifest.json')
+    args = parser.parse_args()
+    global useCache
+    useCache = not args.noCache
+    build(JS, CSS, HTML, 'pannellum', args.release is not None, args.hashed)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+# benchmark.py - Benchmarks for the Pannellum multires tile set generator
+# Copyright (c) 2014-2025 Matthew Petroff
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import time
+import os
+import sys
+import math
+import json
+import hashlib
+import tempfile
+import shutil
+import platform
+import subprocess
+import multiprocessing
+import collections
+import concurrent.futures
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Peak memory use isn't available on Windows
+
+import generate
+
+# Location of golden output hashes, checked by default
+goldenPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark-golden.json')
+
+# Stages that make up tiling, i.e., everything from a cube face to saved tiles,
+# which leaves out waiting for faces reprojected in background threads
+tilingStages = ('resize', 'flatten', 'crop', 'encode', 'write', 'wait')
+
+
+def narrowPanoramaMissingTiles(levels, band=0.1):
+    '''
+    Create the missing tile list of a narrow partial panorama, for which only
+    a horizontal band of tile rows around the horizon of the side faces exists
+    and the top and bottom faces are missing entirely.
+    '''
+    missingTiles = [(2, 1, 0, 0), (3, 1, 0, 0)]
+    for f in (0, 1, 4, 5):
+        for level in range(1, levels + 1):
+            tiles = 2**(level - 1)
+            for i in range(tiles):
+                if abs((i + 0.5) / tiles - 0.5) > band:
+                    missingTiles.extend((f, level, j, i) for j in range(tiles))
+    return missingTiles
+
+def pruneMissingTilesQuadratic(missingTiles):
+    '''
+    Original list-based missing tile pruning, for comparison.
+    '''
+    missingTiles = list(missingTiles)
+    tilesToRemove = []
+    for t in missingTiles:
+        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2, t[3] * 2))
+        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2, t[3] * 2 + 1))
+        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2 + 1, t[3] * 2))
+        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2 + 1, t[3] * 2 + 1))
+    for t in tilesToRemove:
+        if t in missingTiles:
+            missingTiles.pop(missingTiles.index(t))
+    return sorted(missingTiles)
+
+def benchmarkMissingTiles(maxLevels, compareLevels):
+    '''
+    Time pruning and encoding of missing tile lists of increasing size.
+    '''
+    print('Missing tile pruning and encoding:')
+    print('levels  candidates  pruned  prune (s)  encode (s)  quadratic prune (s)')
+    for levels in range(4, maxLevels + 1):
+        tileSize = 512
+        cubeSize = tileSize * 2**(levels - 1)
+        candidates = narrowPanoramaMissingTiles(levels)
+        start = time.perf_counter()
+        pruned = generate.pruneMissingTiles(candidates)
+        pruneTime = time.perf_counter() - start
+        start = time.perf_counter()
+        encoded = generate.encodeMissingTiles(pruned, cubeSize, tileSize, levels)
+        encodeTime = time.perf_counter() - start
+        quadraticTime = ''
+        if levels <= compareLevels:
+            start = time.perf_counter()
+            expected = pruneMissingTilesQuadratic(candidates)
+            quadraticTime = '%.3f' % (time.perf_counter() - start)
+            assert expected == pruned
+            assert generate.encodeMissingTiles(expected, cubeSize, tileSize, levels) == encoded
+        print('%6d  %10d  %6d  %9.3f  %10.3f  %19s' % (levels, len(candidates),
+              len(pruned), pruneTime, encodeTime, quadraticTime))
+
+def synthesizePanorama(width, height):
+    '''
+    Create a deterministic test panorama with smooth gradients, which stand in
+    for sky and walls, and fine, high-contrast detail, which is hard to
+    compress, without depending on a random number generator.
+    '''
+    x = np.arange(width, dtype=np.float64)[np.newaxis, :] / width
+    y = np.arange(height, dtype=np.float64)[:, np.newaxis] / height
+    xi = np.arange(width, dtype=np.int64)[np.newaxis, :]
+    yi = np.arange(height, dtype=np.int64)[:, np.newaxis]
+    texture = ((xi * 7919 + yi * 104729) % 61 - 30) * ((xi // 64 + yi // 64) % 2)
+    r = 128 + 100 * np.sin(2 * math.pi * x) * np.cos(math.pi * y) + texture
+    g = 128 + 100 * np.cos(6 * math.pi * x + 3 * y) + texture
+    b = 255 * y + 0 * x - texture
+    img = np.stack([r, g, b], axis=-1)
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8), 'RGB')
+
+def benchmarkCases(sizes):
+    '''
+    List the generator benchmark cases, as (name, image width, image height,
+    generate.py options), for full equirectangular, full cylindrical, and
+    partial equirectangular panoramas of each width.
+    '''
+    cases = []
+    for width in sizes:
+        cases.append(('equirectangular-' + str(width), width, width // 2, []))
+        # Cylindrical projection with a vertical angle of view of 2 atan(pi / 4)
+        vaov = math.degrees(2 * math.atan(math.pi / 4))
+        cases.append(('cylindrical-' + str(width), width, width // 4,
+                      ['--cylindrical', '--haov', '360', '--vaov', '%.4f' % vaov]))
+        cases.append(('partial-' + str(width), width, width // 4,
+                      ['--haov', '180', '--vaov', '45']))
+    return cases
+
+class MemoryProfile(generate.Profile):
+    '''
+    Profile that also records the peak memory use of the process, in bytes,
+    at the end of each stage.
+    '''
+    def __init__(self):
+        super(MemoryProfile, self).__init__()
+        self.peakRSS = {}
+
+    def record(self, name, start, end, nested=0.0, pid=None):
+        super(MemoryProfile, self).record(name, start, end, nested, pid)
+        self.peakRSS[name] = peakRSS()
+
+def peakRSS():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, but in KiB elsewhere
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def outputHash(output):
+    '''
+    Hash all output files except for the manifest, which records file sizes
+    but nothing else about the output.
+    '''
+    h = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(output)):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name == 'manifest.jsonl':
+                continue
+            h.update(os.path.relpath(path, output).replace(os.sep, '/').encode('utf-8'))
+            h.update(generate.fileHash(path).encode('utf-8'))
+    return h.hexdigest()
+
+def outputBytes(output):
+    '''
+    Count the bytes written for tiles, fallback tiles, and previews.
+    '''
+    counts = {'tiles': 0, 'fallback': 0, 'shtHash': 0, 'thumbnail': 0}
+    for root, dirs, files in os.walk(output):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.basename(root) == 'fallback':
+                counts['fallback'] += os.path.getsize(path)
+            elif root != output or name.endswith(('.pack', '.idx')):
+                counts['tiles'] += os.path.getsize(path)
+    with open(os.path.join(output, 'config.json')) as f:
+        config = json.load(f)['multiRes']
+    counts['shtHash'] = len(config.get('shtHash', ''))
+    counts['thumbnail'] = len(config.get('equirectangularThumbnail', ''))
+    return counts
+
+def runCase(name, width, height, options):
+    '''
+    Generate a tile set for a synthetic panorama and measure each stage. This
+    runs in a fresh process for each case, so peak memory use is per case.
+    '''
+    workDir = tempfile.mkdtemp(prefix='benchmark')
+    try:
+        inputFile = os.path.join(workDir, name + '.png')
+        synthesizePanorama(width, height).save(inputFile, compress_level=1)
+        output = os.path.join(workDir, 'output')
+        args = generate.parseArgs([inputFile, '--output', output, '--tilesize', '256',
+                                   '--thumbnailsize', '256'] + options)
+        profile = MemoryProfile()
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        start = time.perf_counter()
+        try:
+            generate.generate(args, profile)
+        finally:
+            seconds = time.perf_counter() - start
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        with open(os.path.join(output, 'manifest.jsonl')) as f:
+            tiles = sum(len(json.loads(line).get('tiles', {})) for line in f)
+        byteCounts = outputBytes(output)
+        stageBytes = {'write': byteCounts['tiles'], 'fallback': byteCounts['fallback'],
+                      'shtHash': byteCounts['shtHash'], 'thumbnail': byteCounts['thumbnail']}
+        stages = {}
+        for stage, stageSeconds in profile.times.items():
+            stages[stage] = {'seconds': stageSeconds, 'bytes': stageBytes.get(stage, 0),
+                             'peakRSS': profile.peakRSS[stage]}
+        tilingSeconds = sum(stages[stage]['seconds'] for stage in tilingStages if stage in stages)
+        return {
+            'input': {'width': width, 'height': height, 'options': options},
+            'seconds': seconds,
+            'tiles': tiles,
+            'tilesPerSecond': tiles / tilingSeconds if tilingSeconds > 0 else None,
+            'bytes': sum(byteCounts.values()),
+            'peakRSS': peakRSS(),
+            'stages': stages,
+            'outputHash': outputHash(output),
+        }
+    finally:
+        shutil.rmtree(workDir)
+
+def environment():
+    '''
+    Describe what the results were measured with.
+    '''
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def benchmarkGenerate(sizes, options, golden, updateGolden):
+    '''
+    Run the generator benchmark cases, printing a summary of each, and check
+    the output against the golden hashes. Returns the results and whether the
+    output of any case differs from its golden hash.
+    '''
+    results = {'environment': environment(), 'cases': collections.OrderedDict()}
+    goldenHashes = {}
+    if os.path.exists(golden):
+        with open(golden) as f:
+            goldenHashes = json.load(f)
+    changed = False
+    print('case                        stage       seconds  peak RSS (MiB)       bytes')
+    for name, width, height, caseOptions in benchmarkCases(sizes):
+        # Use a fresh process for each case, so peak memory use isn't shared
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            result = pool.submit(runCase, name, width, height, caseOptions + options).result()
+        results['cases'][name] = result
+        for stage, r in result['stages'].items():
+            rss = '%.1f' % (r['peakRSS'] / 2**20) if r['peakRSS'] is not None else '-'
+            print('%-26s  %-10s  %7.3f  %14s  %10d' % (name, stage, r['seconds'], rss, r['bytes']))
+        rss = '%.1f' % (result['peakRSS'] / 2**20) if result['peakRSS'] is not None else '-'
+        print('%-26s  %-10s  %7.3f  %14s  %10d  (%d tiles, %.0f tiles/s)' % (name, 'total',
+              result['seconds'], rss, result['bytes'], result['tiles'],
+              result['tilesPerSecond'] or 0))
+
+        # Golden hashes only apply to the default options
+        if options:
+            continue
+        if updateGolden:
+            goldenHashes[name] = result['outputHash']
+        elif name not in goldenHashes:
+            print('%-26s  no golden output hash' % name)
+        elif goldenHashes[name] != result['outputHash']:
+            print('%-26s  OUTPUT DIFFERS FROM GOLDEN HASH' % name)
+            changed = True
+    if updateGolden:
+        with open(golden, 'w') as f:
+            json.dump(goldenHashes, f, indent=4, sort_keys=True)
+            f.write('\n')
+    return results, changed
+
+def compareResults(old, new):
+    '''
+    Print the change in stage times and memory use between two result files.
+    '''
+    print('case                        stage       old (s)  new (s)  change  old RSS (MiB)  new RSS (MiB)')
+    for name, result in new['cases'].items():
+        if name not in old['cases']:
+            continue
+        oldResult = old['cases'][name]
+        stages = list(result['stages'].items()) + [('total', result)]
+        for stage, r in stages:
+            o = oldResult if stage == 'total' else oldResult['stages'].get(stage)
+            if o is None:
+                continue
+            change = '%+.0f%%' % (100 * (r['seconds'] / o['seconds'] - 1)) if o['seconds'] > 0 else '-'
+            oldRSS = '%.1f' % (o['peakRSS'] / 2**20) if o['peakRSS'] is not None else '-'
+            newRSS = '%.1f' % (r['peakRSS'] / 2**20) if r['peakRSS'] is not None else '-'
+            print('%-26s  %-10s  %7.3f  %7.3f  %6s  %13s  %13s' % (name, stage, o['seconds'],
+                  r['seconds'], change, oldRSS, newRSS))
+        if result['outputHash'] != oldResult['outputHash']:
+            print('%-26s  output differs' % name)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Pannellum multires tile set generator.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    parserGenerate = subparsers.add_parser('generate',
+                                           help='generate tile sets for synthetic panoramas, measuring each stage and checking the output against golden hashes')
+    parserGenerate.add_argument('--sizes', dest='sizes', default=[1024, 4096], type=int, nargs='+',
+                                help='widths of the synthetic panoramas')
+    parserGenerate.add_argument('--json', dest='json', default=None,
+                                help='write the results to this JSON file')
+    parserGenerate.add_argument('--compare', dest='compare', default=None,
+                                help='compare the results with those in a JSON file from an earlier run')
+    parserGenerate.add_argument('--golden', dest='golden', default=goldenPath,
+                                help='JSON file with golden output hashes')
+    parserGenerate.add_argument('--update-golden', dest='updateGolden', action='store_true',
+                                help='update the golden output hashes instead of checking them')
+    parserGenerate.add_argument('options', nargs=argparse.REMAINDER,
+                                help='additional generate.py options, given after --, which skip the golden hash check')
+    parserMissing = subparsers.add_parser('missing-tiles',
+                                          help='time pruning and encoding of missing tile lists of increasing size')
+    parserMissing.add_argument('--levels', dest='levels', default=11, type=int,
+                               help='largest number of levels to benchmark missing tile handling with')
+    parserMissing.add_argument('--compare-levels', dest='compareLevels', default=7, type=int,
+                               help='largest number of levels to also run the original quadratic missing tile pruning with')
+    args = parser.parse_args()
+
+    if args.benchmark == 'missing-tiles':
+        benchmarkMissingTiles(args.levels, args.compareLevels)
+    elif args.benchmark == 'generate':
+        options = [o for o in args.options if o != '--']
+        results, changed = benchmarkGenerate(args.sizes, options, args.golden, args.updateGolden)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=4)
+        if args.compare:
+            with open(args.compare) as f:
+                compareResults(json.load(f), results)
+        if changed:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 
-# Requires Python 3.3+, the Python Pillow and NumPy packages, and
-# nona (from Hugin). The Python pyshtools package is also needed for creating
-# spherical-harmonic-transform previews (which are recommended).
+# Requires Python 3.3+ and the Python Pillow and NumPy packages. Cube faces
+# are rendered with a built-in remapper, or optionally with nona (from Hugin).
 
 # generate.py - A multires tile set generator for Pannellum
 # Extensions to cylindrical input and partial panoramas by David von Oheimb
@@ -26,8 +25,6 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from __future__ import print_function
-
 import argparse
 from PIL import Image
 import os
@@ -38,8 +35,31 @@ from shutil import which as find_executable
 import subprocess
 import base64
 import io
+import collections
+import concurrent.futures
+import tempfile
+import shutil
+import json
+import hashlib
+import html
+import re
+import time
+import contextlib
+import threading
+import tarfile
+import zipfile
+import datetime
+import hmac
+import struct
+import zlib
+import mimetypes
+import urllib.parse
+import urllib.request
 import numpy as np
 
+import multires
+from multires import b83encode
+
 # Allow large images (this could lead to a denial of service attack if you're
 # running this script on user-submitted images.)
 Image.MAX_IMAGE_PIXELS = None
@@ -53,26 +73,82 @@ except KeyError:
 
 # Handle Pillow deprecation
 ANTIALIAS = Image.Resampling.LANCZOS if hasattr(Image, "Resampling") else Image.ANTIALIAS
+BOX = Image.Resampling.BOX if hasattr(Image, "Resampling") else Image.BOX
+BILINEAR = Image.Resampling.BILINEAR if hasattr(Image, "Resampling") else Image.BILINEAR
 
-genPreview = False
-try:
-    import pyshtools as pysh
-    genPreview = True
-except:
-    sys.stderr.write("Unable to import pyshtools. Not generating SHT preview.\n")
-
-b83chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
-def b83encode(vals, length):
-    result = ""
-    for val in vals:
-        for i in range(1, length + 1):
-            result += b83chars[int(val // (83 ** (length - i))) % 83]
-    return result
+class GenerateError(Exception):
+    '''
+    A tile set can't be generated with the given input and options. Raised
+    instead of exiting, so a process hosting the generator survives it; only
+    the command line entry points turn it into an exit status.
+    '''
+
+# Basis matrices for the spherical harmonic transform, keyed by (lmax, rows)
+shtBasisCache = {}
+
+def shtBasis(lmax, n):
+    '''
+    Return longitude (trigonometric) and latitude (weighted Legendre) basis
+    matrices for an n x 2n Driscoll-Healy grid, matching pyshtools'
+    SHExpandDH with 4-pi normalized real harmonics and no Condon-Shortley phase.
+    '''
+    key = (lmax, n)
+    if key in shtBasisCache:
+        return shtBasisCache[key]
+
+    # Grid rows start at the north pole; columns start at zero longitude
+    theta = np.pi * np.arange(n) / n
+    phi = np.pi * np.arange(2 * n) / n
+
+    # Driscoll-Healy quadrature weights, normalized to integrate sin(theta)
+    k = np.arange(n // 2)
+    weights = np.sin(theta) * np.sum(np.sin(np.outer(theta, 2 * k + 1)) / (2 * k + 1), axis=1)
+    weights *= 2 / np.sum(weights)
+
+    # Normalized associated Legendre functions, indexed [l, m, row]
+    x = np.cos(theta)
+    sinTheta = np.sin(theta)
+    legendre = np.zeros((lmax + 1, lmax + 1, n))
+    for m in range(lmax + 1):
+        legendre[m, m] = np.prod(np.arange(1, 2 * m, 2)) * sinTheta ** m
+        if m < lmax:
+            legendre[m + 1, m] = x * (2 * m + 1) * legendre[m, m]
+        for l in range(m + 2, lmax + 1):
+            legendre[l, m] = ((2 * l - 1) * x * legendre[l - 1, m] - (l + m - 1) * legendre[l - 2, m]) / (l - m)
+        for l in range(m, lmax + 1):
+            legendre[l, m] *= math.sqrt((2 - (m == 0)) * (2 * l + 1) * math.factorial(l - m) / math.factorial(l + m))
+    legendre *= weights / (4 * n)
+
+    # Cosine and sine of each order, interleaved as [m, cos / sin]
+    m = np.arange(lmax + 1)
+    trig = np.stack([np.cos(np.outer(phi, m)), np.sin(np.outer(phi, m))], axis=-1).reshape(2 * n, -1)
+
+    shtBasisCache[key] = (trig, legendre)
+    return trig, legendre
+
+def shtExpand(imgs, lmax):
+    '''
+    Calculate real SHT coefficients of a stack of n x 2n x channels
+    equirectangular images, returned as [image, channel, cos / sin, l, m].
+    '''
+    imgs = np.asarray(imgs, dtype=np.float64)
+    n = imgs.shape[1]
+    trig, legendre = shtBasis(lmax, n)
+    # Transform all rows of all channels of all images in one multiply
+    rows = np.moveaxis(imgs, -1, 1) @ trig
+    rows = rows.reshape(rows.shape[:-1] + (lmax + 1, 2))
+    return np.einsum('lmi,...imk->...klm', legendre, rows)
 
 def img2shtHash(img, lmax=5):
     '''
     Create spherical harmonic transform (SHT) hash preview.
     '''
+    return imgs2shtHashes([img], lmax)[0]
+
+def imgs2shtHashes(imgs, lmax=5):
+    '''
+    Create SHT hash previews for a batch of equally-sized images.
+    '''
     def encodeFloat(f, maxVal):
         return np.maximum(0, np.minimum(2 * maxVal, np.round(np.sign(f) * np.sqrt(np.abs(f)) * maxVal + maxVal))).astype(int)
 
@@ -83,311 +159,2351 @@ def img2shtHash(img, lmax=5):
         return quantR * 19 ** 2 + quantG * 19 + quantB
 
     # Calculate SHT coefficients
-    r = pysh.expand.SHExpandDH(img[..., 0], sampling=2, lmax_calc=lmax)
-    g = pysh.expand.SHExpandDH(img[..., 1], sampling=2, lmax_calc=lmax)
-    b = pysh.expand.SHExpandDH(img[..., 2], sampling=2, lmax_calc=lmax)
-
-    # Remove values above diagonal for both sine and cosine components
-    # Also remove first row and column for sine component
-    # These values are always zero
-    r = np.append(r[0][np.tril_indices(lmax + 1)], r[1, 1:, 1:][np.tril_indices(lmax)])
-    g = np.append(g[0][np.tril_indices(lmax + 1)], g[1, 1:, 1:][np.tril_indices(lmax)])
-    b = np.append(b[0][np.tril_indices(lmax + 1)], b[1, 1:, 1:][np.tril_indices(lmax)])
-
-    # Encode as string
-    maxVal = np.max([np.max(r), np.max(b), np.max(g)])
-    vals = encodeCoeff(r, g, b, maxVal).flatten()
-    asstr = b83encode(vals, 2)
-    lmaxStr = b83encode([lmax], 1)
-    maxValStr = b83encode(encodeFloat([2 * maxVal / 255 - 1], 41), 1)
-    return lmaxStr + maxValStr + asstr
-
-
-# Subclass parser to add explaination for semi-option nona flag
-class GenParser(argparse.ArgumentParser):
-    def error(self, message):
-        if '--nona' in message:
-            sys.stderr.write('''IMPORTANT: The location of the nona utility (from Hugin) must be specified
-           with -n, since it was not found on the PATH!\n\n''')
-        super(GenParser, self).error(message)
-
-# Parse input
-parser = GenParser(description='Generate a Pannellum multires tile set from a full or partial equirectangular or cylindrical panorama.',
-                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('inputFile', metavar='INPUT',
-                    help='panorama to be processed')
-parser.add_argument('-C', '--cylindrical', action='store_true',
-                    help='input projection is cylindrical (default is equirectangular)')
-parser.add_argument('-H', '--haov', dest='haov', default=-1, type=float,
-                    help='horizontal angle of view (defaults to 360.0 for full panorama)')
-parser.add_argument('-F', '--hfov', dest='hfov', default=100.0, type=float,
-                    help='starting horizontal field of view (defaults to 100.0)')
-parser.add_argument('-V', '--vaov', dest='vaov', default=-1, type=float,
-                    help='vertical angle of view (defaults to 180.0 for full panorama)') 
-parser.add_argument('-O', '--voffset', dest='vOffset', default=0.0, type=float,
-                    help='starting pitch position (defaults to 0.0)')
-parser.add_argument('-e', '--horizon', dest='horizon', default=0.0, type=int,
-                    help='offset of the horizon in pixels (negative if above middle, defaults to 0)')
-parser.add_argument('-o', '--output', dest='output', default='./output',
-                    help='output directory, optionally to be used as basePath (defaults to "./output")')
-parser.add_argument('-s', '--tilesize', dest='tileSize', default=512, type=int,
-                    help='tile size in pixels')
-parser.add_argument('-f', '--fallbacksize', dest='fallbackSize', default=1024, type=int,
-                    help='fallback tile size in pixels (defaults to 1024, set to 0 to skip)')
-parser.add_argument('-c', '--cubesize', dest='cubeSize', default=0, type=int,
-                    help='cube size in pixels, or 0 to retain all details')
-parser.add_argument('-b', '--backgroundcolor', dest='backgroundColor', default="[0.0, 0.0, 0.0]", type=str,
-                    help='RGB triple of values [0, 1] defining background color shown past the edges of a partial panorama (defaults to "[0.0, 0.0, 0.0]")')
-parser.add_argument('-B', '--avoidbackground', action='store_true',
-                    help='viewer should limit view to avoid showing background, so using --backgroundcolor is not needed')
-parser.add_argument('-a', '--autoload', action='store_true',
-                    help='automatically load panorama in viewer')
-parser.add_argument('-q', '--quality', dest='quality', default=75, type=int,
-                    help='output JPEG quality 0-100')
-parser.add_argument('--png', action='store_true',
-                    help='output PNG tiles instead of JPEG tiles')
-parser.add_argument('--thumbnailsize', dest='thumbnailSize', default=0, type=int,
-                    help='width of equirectangular thumbnail preview (defaults to no thumbnail; must be power of two; >512 not recommended)')
-parser.add_argument('-n', '--nona', default=nona, required=nona is None,
-                    metavar='EXECUTABLE',
-                    help='location of the nona executable to use')
-parser.add_argument('-G', '--gpu', action='store_true',
-                    help='perform image remapping by nona on the GPU')
-parser.add_argument('-d', '--debug', action='store_true',
-                    help='debug mode (print status info and keep intermediate files)')
-args = parser.parse_args()
-
-
-# Check argument
-if args.thumbnailSize > 0:
-    if args.thumbnailSize & (args.thumbnailSize - 1) != 0:
-        print('Thumbnail size, if specified, must be a power of two')
-        sys.exit(1)
+    coeffs = shtExpand(np.asarray(imgs)[..., :3], lmax)
+
+    hashes = []
+    for c in coeffs:
+        # Remove values above diagonal for both sine and cosine components
+        # Also remove first row and column for sine component
+        # These values are always zero
+        r, g, b = [np.append(c[i, 0][np.tril_indices(lmax + 1)], c[i, 1, 1:, 1:][np.tril_indices(lmax)]) for i in range(3)]
+
+        # Encode as string
+        maxVal = np.max([np.max(r), np.max(b), np.max(g)])
+        vals = encodeCoeff(r, g, b, maxVal).flatten()
+        asstr = b83encode(vals, 2)
+        lmaxStr = b83encode([lmax], 1)
+        maxValStr = b83encode(encodeFloat([2 * maxVal / 255 - 1], 41), 1)
+        hashes.append(lmaxStr + maxValStr + asstr)
+    return hashes
 
-# Create output directory
-if os.path.exists(args.output):
-    print('Output directory "' + args.output + '" already exists')
-    if not args.debug:
-        sys.exit(1)
-else:
-    os.makedirs(args.output)
-
-# Process input image information
-print('Processing input image information...')
-origWidth, origHeight = Image.open(args.inputFile).size
-haov = args.haov
-if haov == -1:
-    if args.cylindrical or float(origWidth) / origHeight == 2:
-        print('Assuming --haov 360.0')
-        haov = 360.0
-    else:
-        print('Unless given the --haov option, equirectangular input image must be a full (not partial) panorama!')
-        sys.exit(1)
-vaov = args.vaov
-if vaov == -1:
-    if args.cylindrical or float(origWidth) / origHeight == 2:
-        print('Assuming --vaov 180.0')
-        vaov = 180.0
-    else:
-        print('Unless given the --vaov option, equirectangular input image must be a full (not partial) panorama!')
-        sys.exit(1)
-if args.cubeSize != 0:
-    cubeSize = args.cubeSize
-else:
-    cubeSize = 8 * int((360 / haov) * origWidth / math.pi / 8)
-tileSize = min(args.tileSize, cubeSize)
-levels = int(math.ceil(math.log(float(cubeSize) / tileSize, 2))) + 1
-if int(cubeSize / 2**(levels - 2)) == tileSize:
-    levels -= 1  # Handle edge case
-origHeight = str(origHeight)
-origWidth = str(origWidth)
-origFilename = os.path.join(os.getcwd(), args.inputFile)
-extension = '.jpg'
-if args.png:
-    extension = '.png'
-partialPano = True if args.haov != -1 and args.vaov != -1 else False
-colorList = ast.literal_eval(args.backgroundColor)
-colorTuple = (int(colorList[0]*255), int(colorList[1]*255), int(colorList[2]*255))
-
-# Don't generate preview for partial panoramas
-if haov < 360 or vaov < 180:
-    genPreview = False
-
-if args.debug:
-    print('maxLevel: '+ str(levels))
-    print('tileResolution: '+ str(tileSize))
-    print('cubeResolution: '+ str(cubeSize))
-
-# Generate PTO file for nona to generate cube faces
 # Face order: front, back, up, down, left, right
 faceLetters = ['f', 'b', 'u', 'd', 'l', 'r']
-projection = "f1" if args.cylindrical else "f4"
-pitch = 0
-text = []
-facestr = 'i a0 b0 c0 d0 e'+ str(args.horizon) +' '+ projection + ' h' + origHeight +' w'+ origWidth +' n"'+ origFilename +'" r0 v' + str(haov)
-text.append('p E0 R0 f0 h' + str(cubeSize) + ' w' + str(cubeSize) + ' n"TIFF_m" u0 v90')
-text.append('m g1 i0 m2 p0.00784314')
-text.append(facestr +' p' + str(pitch+ 0) +' y0'  )
-text.append(facestr +' p' + str(pitch+ 0) +' y180')
-text.append(facestr +' p' + str(pitch-90) +' y0'  )
-text.append(facestr +' p' + str(pitch+90) +' y0'  )
-text.append(facestr +' p' + str(pitch+ 0) +' y90' )
-text.append(facestr +' p' + str(pitch+ 0) +' y-90')
-text.append('v')
-text.append('*')
-text = '\n'.join(text)
-with open(os.path.join(args.output, 'cubic.pto'), 'w') as f:
-    f.write(text)
-
-# Create cube faces
-print('Generating cube faces...')
-subprocess.check_call([args.nona, ('-g' if args.gpu else '-d') , '-o', os.path.join(args.output, 'face'), os.path.join(args.output, 'cubic.pto')])
-faces = ['face0000.tif', 'face0001.tif', 'face0002.tif', 'face0003.tif', 'face0004.tif', 'face0005.tif']
-
-# Generate tiles
-print('Generating tiles...')
-missingTiles = []
-for f in range(0, 6):
-    size = cubeSize
-    faceExists = os.path.exists(os.path.join(args.output, faces[f]))
-    if faceExists:
-        face = Image.open(os.path.join(args.output, faces[f]))
-        for level in range(levels, 0, -1):
-            if not os.path.exists(os.path.join(args.output, str(level))):
-                os.makedirs(os.path.join(args.output, str(level)))
-            tiles = int(math.ceil(float(size) / tileSize))
-            if (level < levels):
-                face = face.resize([size, size], ANTIALIAS)
-            for i in range(0, tiles):
-                for j in range(0, tiles):
-                    left = j * tileSize
-                    upper = i * tileSize
-                    right = min(j * args.tileSize + args.tileSize, size) # min(...) not really needed
-                    lower = min(i * args.tileSize + args.tileSize, size) # min(...) not really needed
-                    tile = face.crop([left, upper, right, lower])
-                    if args.debug:
-                        print('level: '+ str(level) + ' tiles: '+ str(tiles) + ' tileSize: ' + str(tileSize) + ' size: '+ str(size))
-                        print('left: '+ str(left) + ' upper: '+ str(upper) + ' right: '+ str(right) + ' lower: '+ str(lower))
-                    colors = tile.getcolors(1)
-                    if not partialPano or colors == None or colors[0][1] != colorTuple:
-                        # More than just one color (the background), i.e., non-empty tile
-                        if tile.mode in ('RGBA', 'LA'):
-                            background = Image.new(tile.mode[:-1], tile.size, colorTuple)
-                            background.paste(tile, tile.split()[-1])
-                            tile = background
-                        colors = tile.getcolors(1)
-                        if not genPreview and colors is not None and colors[0][1] == colorTuple:
-                            missingTiles.append((f, level, j, i))
-                        else:
-                            tile.save(os.path.join(args.output, str(level), faceLetters[f] + str(i) + '_' + str(j) + extension), quality=args.quality)
-                    else:
-                        missingTiles.append((f, level, j, i))
-            size = int(size / 2)
+
+# Direction vectors of each cube face, as in faceDirections, with each of x,
+# y, and z given as coefficients of the face coordinates u (right) and v
+# (down), which are -1 to 1 across the face, and a constant
+faceBases = [
+    ((1, 0, 0), (0, -1, 0), (0, 0, 1)),
+    ((-1, 0, 0), (0, -1, 0), (0, 0, -1)),
+    ((1, 0, 0), (0, 0, 1), (0, 1, 0)),
+    ((1, 0, 0), (0, 0, -1), (0, -1, 0)),
+    ((0, 0, -1), (0, -1, 0), (1, 0, 0)),
+    ((0, 0, 1), (0, -1, 0), (-1, 0, 0)),
+]
+
+def faceDirections(f, cubeSize, rowStart, rowEnd, colStart=0, colEnd=None):
+    '''
+    Calculate direction vectors (x right, y up, z forward) through the pixel
+    centers of rows [rowStart, rowEnd) and columns [colStart, colEnd) of cube
+    face f.
+    '''
+    c = (np.arange(cubeSize, dtype=np.float64) + 0.5) * (2.0 / cubeSize) - 1
+    u, v = np.meshgrid(c[colStart:colEnd], c[rowStart:rowEnd])
+    one = np.ones_like(u)
+    if f == 0:
+        return u, -v, one
+    elif f == 1:
+        return -u, -v, -one
+    elif f == 2:
+        return u, one, v
+    elif f == 3:
+        return u, -one, -v
+    elif f == 4:
+        return -one, -v, u
+    return one, -v, -u
+
+def cubicWeights(t):
+    '''
+    Calculate the four bicubic convolution weights (a = -0.75, as used by
+    Hugin) for taps at offsets -1, 0, 1, 2 from fractional positions t.
+    '''
+    a = -0.75
+    def near(d):
+        return ((a + 2) * d - (a + 3)) * d * d + 1
+    def far(d):
+        return ((a * d - 5 * a) * d + 8 * a) * d - 4 * a
+    return far(t + 1), near(t), near(1 - t), far(2 - t)
+
+def sampleImage(src, sx, sy, wrap, interpolation):
+    '''
+    Sample source image array at fractional pixel positions using bilinear or
+    bicubic interpolation. Out-of-bounds taps are clamped to the image edge,
+    except horizontally for full panoramas, where they wrap around.
+    '''
+    h, w = src.shape[:2]
+    x0 = np.floor(sx)
+    y0 = np.floor(sy)
+    fx = (sx - x0).astype(np.float32)
+    fy = (sy - y0).astype(np.float32)
+    x0 = x0.astype(np.intp)
+    y0 = y0.astype(np.intp)
+    if interpolation == 'bicubic':
+        offsets = range(-1, 3)
+        wx = cubicWeights(fx)
+        wy = cubicWeights(fy)
+    else:
+        offsets = range(0, 2)
+        wx = (1 - fx, fx)
+        wy = (1 - fy, fy)
+    flat = src.reshape(h * w, -1)
+    xs = [(x0 + o) % w if wrap else np.clip(x0 + o, 0, w - 1) for o in offsets]
+    out = np.zeros(sx.shape + (flat.shape[1],), dtype=np.float32)
+    for j in range(len(offsets)):
+        yi = np.clip(y0 + offsets[j], 0, h - 1) * w
+        row = np.zeros_like(out)
+        for i in range(len(offsets)):
+            row += np.take(flat, yi + xs[i], axis=0) * wx[i][..., np.newaxis]
+        out += row * wy[j][..., np.newaxis]
+    return np.clip(np.rint(out), 0, 255).astype(np.uint8)
+
+def sourceCoordinates(f, cubeSize, rowStart, rowEnd, srcWidth, srcHeight,
+                      haov, horizon=0, cylindrical=False, colStart=0, colEnd=None):
+    '''
+    Calculate the source image pixel coordinates that rows [rowStart, rowEnd)
+    and columns [colStart, colEnd) of cube face f map to, along with a mask
+    of which of them the source image covers.
+    '''
+    scale = srcWidth / math.radians(haov)  # Pixels per radian
+    x, y, z = faceDirections(f, cubeSize, rowStart, rowEnd, colStart, colEnd)
+    lon = np.arctan2(x, z)
+    lat = np.arctan2(y, np.hypot(x, z))
+    sx = lon * scale + srcWidth / 2 - 0.5
+    if cylindrical:
+        sy = srcHeight / 2 + horizon - np.tan(lat) * scale - 0.5
     else:
-        missingTiles.append((f, level, 0, 0))
-
-# Tell viewer not to load missing tiles
-if len(missingTiles) > 0:
-    # Remove children of missing tiles, since they won't be loaded anyway
-    tilesToRemove = []
-    for t in missingTiles:
-        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2, t[3] * 2))
-        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2, t[3] * 2 + 1))
-        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2 + 1, t[3] * 2))
-        tilesToRemove.append((t[0], t[1] + 1, t[2] * 2 + 1, t[3] * 2 + 1))
-    for t in tilesToRemove:
-        if t in missingTiles:
-            missingTiles.pop(missingTiles.index(t))
-    # Encode missing tile list as string
-    missingTilesStr = ''
+        sy = srcHeight / 2 + horizon - lat * scale - 0.5
+    covered = (sy >= -0.5) & (sy <= srcHeight - 0.5)
+    if haov < 360:
+        covered &= (sx >= -0.5) & (sx <= srcWidth - 0.5)
+    return sx, sy, covered
+
+def remapRows(src, f, cubeSize, rowStart, rowEnd, haov, horizon=0,
+              cylindrical=False, interpolation='bicubic', colStart=0, colEnd=None):
+    '''
+    Render rows [rowStart, rowEnd) of cube face f as an RGBA array, with the
+    alpha channel marking the pixels covered by the source image. Only
+    columns [colStart, colEnd) are rendered, and the rest are left empty.
+    '''
+    srcHeight, srcWidth = src.shape[:2]
+    rows = np.zeros((rowEnd - rowStart, cubeSize, 4), dtype=np.uint8)
+    sx, sy, covered = sourceCoordinates(f, cubeSize, rowStart, rowEnd, srcWidth, srcHeight,
+                                        haov, horizon, cylindrical, colStart, colEnd)
+    span = rows[:, colStart:colEnd]
+    if covered.any():
+        span[..., :src.shape[2]] = sampleImage(src, sx, sy, haov >= 360, interpolation)
+    if src.shape[2] == 4:
+        span[..., 3] *= covered
+    else:
+        span[..., 3] = covered * 255
+    return rows
+
+def coverageBounds(srcWidth, srcHeight, haov, horizon=0, cylindrical=False):
+    '''
+    Calculate the half-width in longitude of the directions the source image
+    covers, or None for full panoramas, and the sines of their minimum and
+    maximum latitude, matching the coverage mask of sourceCoordinates.
+    '''
+    scale = srcWidth / math.radians(haov)  # Pixels per radian
+    latitudes = [(horizon - srcHeight / 2) / scale, (horizon + srcHeight / 2) / scale]
+    if cylindrical:
+        latitudes = [math.atan(lat) for lat in latitudes]
+    latitudes = [math.sin(max(min(lat, math.pi / 2), -math.pi / 2)) for lat in latitudes]
+    return (math.radians(haov) / 2 if haov < 360 else None,) + tuple(latitudes)
+
+def facePoint(f, u, v):
+    return [b[0] * u + b[1] * v + b[2] for b in faceBases[f]]
+
+def faceHalfPlane(f, normal):
+    '''
+    Express the half-space of directions d with normal . d <= 0 as the
+    coefficients w of the half-plane w[0] u + w[1] v + w[2] <= 0 of face f.
+    '''
+    return [sum(normal[k] * faceBases[f][k][i] for k in range(3)) for i in range(3)]
+
+def clipPolygon(polygon, w, eps=1e-9):
+    '''
+    Clip a convex polygon, given as a list of (u, v) vertices, to the
+    half-plane w[0] u + w[1] v + w[2] <= eps.
+    '''
+    result = []
+    for k in range(len(polygon)):
+        p = polygon[k]
+        q = polygon[(k + 1) % len(polygon)]
+        dp = w[0] * p[0] + w[1] * p[1] + w[2] - eps
+        dq = w[0] * q[0] + w[1] * q[1] + w[2] - eps
+        if dp <= 0:
+            result.append(p)
+        if (dp < 0 < dq) or (dq < 0 < dp):
+            t = dp / (dp - dq)
+            result.append((p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])))
+    return result
+
+def latitudeRange(f, polygon):
+    '''
+    Calculate the range of the sine of the latitude of the directions through
+    a convex polygon on cube face f. Since each edge is an arc of a great
+    circle, the extremes are at a vertex, at the one point of an edge where
+    the latitude is stationary, or at a pole inside the polygon.
+    '''
+    lo = 1.0
+    hi = -1.0
+    for k in range(len(polygon)):
+        a = facePoint(f, *polygon[k])
+        d = [q - p for p, q in zip(a, facePoint(f, *polygon[(k + 1) % len(polygon)]))]
+        aa = sum(x * x for x in a)
+        ad = sum(x * y for x, y in zip(a, d))
+        dd = sum(x * x for x in d)
+        ts = [0.0]
+        den = d[1] * ad - a[1] * dd
+        if den != 0:
+            t = (a[1] * ad - d[1] * aa) / den
+            if 0 < t < 1:
+                ts.append(t)
+        for t in ts:
+            p = [x + t * y for x, y in zip(a, d)]
+            sinLat = p[1] / math.sqrt(p[0] * p[0] + p[1] * p[1] + p[2] * p[2])
+            lo = min(lo, sinLat)
+            hi = max(hi, sinLat)
+
+    # The poles are only on the up and down faces, at the center
+    b = faceBases[f]
+    if b[0][2] == 0 and b[2][2] == 0:
+        crosses = [(q[0] - p[0]) * -p[1] - (q[1] - p[1]) * -p[0]
+                   for p, q in zip(polygon, polygon[1:] + polygon[:1])]
+        if all(c >= -1e-12 for c in crosses) or all(c <= 1e-12 for c in crosses):
+            if b[1][2] > 0:
+                hi = 1.0
+            else:
+                lo = -1.0
+    return lo, hi
+
+def longitudePieces(f, polygon, halfWidth, eps=1e-9):
+    '''
+    Clip a convex polygon on cube face f to the directions within halfWidth
+    of zero longitude, which, as the intersection or, for more than 90
+    degrees, union of two half-spaces, gives up to two convex pieces.
+    '''
+    if halfWidth is None:
+        return [polygon]
+    w1 = faceHalfPlane(f, (math.cos(halfWidth), 0, -math.sin(halfWidth)))
+    w2 = faceHalfPlane(f, (-math.cos(halfWidth), 0, -math.sin(halfWidth)))
+    if halfWidth <= math.pi / 2:
+        pieces = [clipPolygon(clipPolygon(polygon, w1, eps), w2, eps)]
+    else:
+        pieces = [clipPolygon(polygon, w1, eps), clipPolygon(polygon, w2, eps)]
+    return [piece for piece in pieces if len(piece) > 0]
+
+def polygonCovered(f, polygon, bounds):
+    '''
+    Check if any direction through a convex polygon on cube face f is
+    covered by the source image, given its coverageBounds. Directions on the
+    boundary count as covered, so this errs on the side of coverage.
+    '''
+    halfWidth, sinLo, sinHi = bounds
+    for piece in longitudePieces(f, polygon, halfWidth):
+        lo, hi = latitudeRange(f, piece)
+        if hi >= sinLo - 1e-9 and lo <= sinHi + 1e-9:
+            return True
+    return False
+
+def coveredTiles(f, size, tileSize, bounds, margin=0):
+    '''
+    Determine which tiles of a level of cube face f, which is size pixels
+    across, the source image may cover, given its coverageBounds, returning a
+    boolean array indexed by tile row and column. Tiles are extended by
+    margin pixels, for pixels that resampling spreads into them.
+    '''
+    tiles = int(math.ceil(float(size) / tileSize))
+    edges = [max(min(k * tileSize + offset, size), 0) * 2.0 / size - 1
+             for k in range(tiles) for offset in (-margin, tileSize + margin)]
+    covered = np.zeros((tiles, tiles), dtype=bool)
+    for i in range(tiles):
+        v0, v1 = edges[2 * i], edges[2 * i + 1]
+        for j in range(tiles):
+            u0, u1 = edges[2 * j], edges[2 * j + 1]
+            covered[i, j] = polygonCovered(f, [(u0, v0), (u1, v0), (u1, v1), (u0, v1)], bounds)
+    return covered
+
+def coveredColumns(covered, blockSize, size, rowStart, rowEnd):
+    '''
+    Find the columns [colStart, colEnd) of rows [rowStart, rowEnd) of a face
+    level that lie in blocks marked as covered, or None if there aren't any.
+    '''
+    cols = np.flatnonzero(covered[rowStart // blockSize:(rowEnd - 1) // blockSize + 1].any(axis=0))
+    if len(cols) == 0:
+        return None
+    return int(cols[0]) * blockSize, min((int(cols[-1]) + 1) * blockSize, size)
+
+def coverageBlockSize(cubeSize):
+    '''
+    Size of the blocks that remapping is limited to, which keeps the number
+    of blocks checked per face small.
+    '''
+    return max(128, cubeSize // 32)
+
+def polygonInside(f, polygon, bounds):
+    '''
+    Check if every direction through a convex polygon on cube face f is
+    covered by the source image, given its coverageBounds. Directions near
+    the boundary count as uncovered, so this errs on the side of not.
+    '''
+    halfWidth, sinLo, sinHi = bounds
+    if halfWidth is not None:
+        # Clip the polygon to the directions outside the covered longitudes
+        w1 = [-w for w in faceHalfPlane(f, (math.cos(halfWidth), 0, -math.sin(halfWidth)))]
+        w2 = [-w for w in faceHalfPlane(f, (-math.cos(halfWidth), 0, -math.sin(halfWidth)))]
+        if halfWidth <= math.pi / 2:
+            if len(clipPolygon(polygon, w1, -1e-9)) > 0 or len(clipPolygon(polygon, w2, -1e-9)) > 0:
+                return False
+        elif len(clipPolygon(clipPolygon(polygon, w1, -1e-9), w2, -1e-9)) > 0:
+            return False
+    lo, hi = latitudeRange(f, polygon)
+    return lo > sinLo + 1e-9 and hi < sinHi - 1e-9
+
+def faceCoverage(f, cubeSize, srcWidth, srcHeight, haov, horizon=0,
+                 cylindrical=False):
+    '''
+    Determine if the source image covers none, part, or all of cube face f,
+    returning None, False, or True, respectively. Blocks of the face are
+    checked against the geometry of the source's angles of view, and only
+    the pixels of blocks on the edge of the covered area are looked at.
+    '''
+    bounds = coverageBounds(srcWidth, srcHeight, haov, horizon, cylindrical)
+    blockSize = coverageBlockSize(cubeSize)
+    anyCovered = False
+    allCovered = True
+    for rowStart in range(0, cubeSize, blockSize):
+        rowEnd = min(rowStart + blockSize, cubeSize)
+        v0, v1 = rowStart * 2.0 / cubeSize - 1, rowEnd * 2.0 / cubeSize - 1
+        for colStart in range(0, cubeSize, blockSize):
+            colEnd = min(colStart + blockSize, cubeSize)
+            u0, u1 = colStart * 2.0 / cubeSize - 1, colEnd * 2.0 / cubeSize - 1
+            if not polygonCovered(f, [(u0, v0), (u1, v0), (u1, v1), (u0, v1)], bounds):
+                allCovered = False
+                continue
+            # Square through the outermost pixel centers of the block
+            d = 1.0 / cubeSize
+            if polygonInside(f, [(u0 + d, v0 + d), (u1 - d, v0 + d), (u1 - d, v1 - d), (u0 + d, v1 - d)], bounds):
+                anyCovered = True
+                continue
+            covered = sourceCoordinates(f, cubeSize, rowStart, rowEnd, srcWidth, srcHeight, haov,
+                                        horizon, cylindrical, colStart, colEnd)[2]
+            anyCovered = anyCovered or covered.any()
+            allCovered = allCovered and covered.all()
+    return allCovered if anyCovered else None
+
+def remapFace(src, f, cubeSize, haov, horizon=0, cylindrical=False,
+              interpolation='bicubic', stripPixels=2**20):
+    '''
+    Render cube face f from an equirectangular or cylindrical source image
+    array, matching the rectilinear 90 degree output nona produces from the
+    PTO file this script used to write. Returns None if the source doesn't
+    cover any of the face, an RGBA image if it covers part of the face or has
+    an alpha channel itself, and an RGB image otherwise. Only the blocks of
+    the face that the source covers are rendered.
+    '''
+    blockSize = coverageBlockSize(cubeSize)
+    covered = coveredTiles(f, cubeSize, blockSize,
+                           coverageBounds(src.shape[1], src.shape[0], haov, horizon, cylindrical))
+    if not covered.any():
+        return None
+    face = np.zeros((cubeSize, cubeSize, 4), dtype=np.uint8)
+    for blockStart in range(0, cubeSize, blockSize):
+        blockEnd = min(blockStart + blockSize, cubeSize)
+        cols = coveredColumns(covered, blockSize, cubeSize, blockStart, blockEnd)
+        if cols is None:
+            continue
+        stripRows = max(1, stripPixels // (cols[1] - cols[0]))
+        for rowStart in range(blockStart, blockEnd, stripRows):
+            rowEnd = min(rowStart + stripRows, blockEnd)
+            face[rowStart:rowEnd] = remapRows(src, f, cubeSize, rowStart, rowEnd, haov, horizon,
+                                              cylindrical, interpolation, *cols)
+    alpha = face[..., 3]
+    if not alpha.any():
+        return None
+    if src.shape[2] == 3 and alpha.all():
+        return Image.fromarray(face[..., :3], 'RGB')
+    return Image.fromarray(face, 'RGBA')
+
+class StreamingLevel(object):
+    '''
+    Cube face level that is filled in from the top, one strip of rows at a
+    time, possibly in a memory-mapped scratch file. Levels resampled from it
+    are filled in incrementally, as soon as all of the rows they depend on
+    are available, and a callback is notified of each batch of new rows.
+    '''
+    def __init__(self, size, channels, scratch=None, callback=None, filter=ANTIALIAS):
+        self.size = size
+        self.mode = 'RGBA' if channels == 4 else 'RGB'
+        if scratch is None:
+            self.rows = np.empty((size, size, channels), dtype=np.uint8)
+        else:
+            self.rows = np.memmap(scratch, dtype=np.uint8, mode='w+',
+                                  shape=(size, size, channels))
+        self.done = 0
+        self.callback = callback
+        self.filter = filter
+        self.children = []
+
+    def append(self, rows):
+        '''
+        Add rows to the bottom of the filled-in part of the level.
+        '''
+        self.rows[self.done:self.done + len(rows)] = rows
+        self.done += len(rows)
+        if self.callback is not None:
+            self.callback(self)
+        for child in self.children:
+            child.resample(self)
+
+    def resample(self, parent):
+        '''
+        Fill in as many rows as possible from the available rows of the parent
+        level, using the same filter and sample positions as resizing the
+        whole parent level at once.
+        '''
+        if self.filter == BOX and parent.size == 2 * self.size:
+            # Average whole 2x2 blocks, as downsample() does
+            end = self.size if parent.done == parent.size else parent.done // 2
+            if end <= self.done:
+                return
+            strip = Image.fromarray(np.asarray(parent.rows[2 * self.done:2 * end]), parent.mode)
+            self.append(np.asarray(strip.reduce(2)))
+            return
+        scale = float(parent.size) / self.size
+        margin = int(math.ceil(3 * scale)) + 2  # Lanczos filter support
+        if parent.done == parent.size:
+            end = self.size
+        else:
+            end = min(self.size, int(math.floor((parent.done - margin) / scale - 0.5)) + 1)
+        if end <= self.done:
+            return
+        top = max(0, int(math.floor(self.done * scale)) - margin)
+        bottom = min(parent.done, int(math.ceil(end * scale)) + margin)
+        strip = Image.fromarray(np.asarray(parent.rows[top:bottom]), parent.mode)
+        strip = strip.resize([self.size, end - self.done], self.filter,
+                             box=(0, self.done * scale - top, parent.size, end * scale - top))
+        self.append(np.asarray(strip))
+
+def downsample(img, size, method):
+    '''
+    Resize a cube face level to the size of the next level down, either with
+    a Lanczos filter or by averaging each 2x2 block of pixels.
+    '''
+    if method == 'box':
+        if img.size[0] == 2 * size:
+            return img.reduce(2)
+        return img.resize([size, size], BOX)
+    return img.resize([size, size], ANTIALIAS)
+
+def pyramidSizes(cubeSize, levels):
+    '''
+    List the face size of each level, from the top level down.
+    '''
+    sizes = [cubeSize]
+    for level in range(levels - 1, 0, -1):
+        sizes.append(int(sizes[-1] / 2))
+    return sizes
+
+def fallbackLevel(sizes, fallbackSize):
+    '''
+    Index of the smallest level that's at least as large as the fallback
+    tiles, which they're resized from.
+    '''
+    index = 0
+    while index + 1 < len(sizes) and sizes[index + 1] >= fallbackSize:
+        index += 1
+    return index
+
+def flattenAlpha(img, color):
+    '''
+    Composite an image with an alpha channel onto a solid background color.
+    '''
+    if img.mode not in ('RGBA', 'LA'):
+        return img
+    background = Image.new(img.mode[:-1], img.size, color)
+    background.paste(img, img.split()[-1])
+    return background
+
+def backgroundTiles(img, tileSize, color):
+    '''
+    Find the tiles of an image that consist entirely of the background color,
+    returning a boolean array indexed by tile row and column.
+    '''
+    arr = np.asarray(img)
+    rows = int(math.ceil(float(arr.shape[0]) / tileSize))
+    cols = int(math.ceil(float(arr.shape[1]) / tileSize))
+    if arr.ndim != 3:
+        return np.zeros((rows, cols), dtype=bool)
+    background = np.ones((rows * tileSize, cols * tileSize), dtype=bool)
+    isBackground = background[:arr.shape[0], :arr.shape[1]]
+    for c in range(arr.shape[2]):
+        isBackground &= arr[..., c] == color[c]
+    return background.reshape(rows, tileSize, cols, tileSize).all(axis=(1, 3))
+
+def detailedTiles(img, parent, tileSize, threshold):
+    '''
+    Find the tiles of a flattened face level that add detail over the parent
+    level, i.e., whose root-mean-square difference from the parent level
+    upsampled with bilinear filtering, as the viewer draws it, is at least
+    threshold, returning a boolean array indexed by tile row and column.
+    '''
+    upsampled = np.asarray(parent.resize(img.size, BILINEAR))
+    arr = np.asarray(img)
+    rows = int(math.ceil(float(arr.shape[0]) / tileSize))
+    cols = int(math.ceil(float(arr.shape[1]) / tileSize))
+    detailed = np.zeros((rows, cols), dtype=bool)
+    for i in range(rows):
+        # One row of tiles at a time, to limit memory use
+        diff = arr[i * tileSize:(i + 1) * tileSize].astype(np.float32)
+        diff -= upsampled[i * tileSize:(i + 1) * tileSize]
+        squared = (diff ** 2).mean(axis=2)
+        for j in range(cols):
+            tile = squared[:, j * tileSize:(j + 1) * tileSize]
+            detailed[i, j] = math.sqrt(tile.mean()) >= threshold
+    return detailed
+
+# Tile formats: file extension and Pillow format name
+tileFormats = collections.OrderedDict([
+    ('jpeg', ('.jpg', 'JPEG')),
+    ('png', ('.png', 'PNG')),
+    ('webp', ('.webp', 'WEBP')),
+    ('avif', ('.avif', 'AVIF')),
+])
+lossyFormats = ('jpeg', 'webp', 'avif')
+
+def availableTileFormats():
+    '''
+    List the tile formats that the installed version of Pillow can write.
+    '''
+    Image.init()
+    return [name for name, (_, fmt) in tileFormats.items() if fmt in Image.SAVE]
+
+def encodeTile(tile, params, quality=None):
+    '''
+    Encode a tile (or fallback tile) in the output format.
+    '''
+    buf = io.BytesIO()
+    tile.save(buf, format=tileFormats[params['format']][1],
+              quality=params['quality'] if quality is None else quality, **params['saveOptions'])
+    return buf.getvalue()
+
+def structuralSimilarity(a, b):
+    '''
+    Mean structural similarity (SSIM) of two grayscale images, computed over
+    non-overlapping 8x8 pixel blocks.
+    '''
+    block = min(8, a.shape[0], a.shape[1])
+    rows = a.shape[0] // block
+    cols = a.shape[1] // block
+    a = a[:rows * block, :cols * block].reshape(rows, block, cols, block)
+    b = b[:rows * block, :cols * block].reshape(rows, block, cols, block)
+    meanA = a.mean(axis=(1, 3))
+    meanB = b.mean(axis=(1, 3))
+    varA = a.var(axis=(1, 3))
+    varB = b.var(axis=(1, 3))
+    cov = (a * b).mean(axis=(1, 3)) - meanA * meanB
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    ssim = (2 * meanA * meanB + c1) * (2 * cov + c2) / ((meanA ** 2 + meanB ** 2 + c1) * (varA + varB + c2))
+    return ssim.mean()
+
+def encodeTileSearch(tile, params):
+    '''
+    Encode a tile at the highest quality, up to the maximum quality, that
+    fits in the target number of bytes, or at the lowest quality that reaches
+    the target SSIM, using a binary search over the quality setting.
+    '''
+    if not params['targetBytes'] and not params['targetSSIM']:
+        return encodeTile(tile, params)
+    encoded = {}
+    def encode(quality):
+        if quality not in encoded:
+            encoded[quality] = encodeTile(tile, params, quality)
+        return encoded[quality]
+    low, high = 1, params['quality']
+    if params['targetBytes']:
+        while low < high:
+            mid = (low + high + 1) // 2
+            if len(encode(mid)) <= params['targetBytes']:
+                low = mid
+            else:
+                high = mid - 1
+    else:
+        reference = np.asarray(tile.convert('L'), dtype=np.float64)
+        while low < high:
+            mid = (low + high) // 2
+            decoded = np.asarray(Image.open(io.BytesIO(encode(mid))).convert('L'), dtype=np.float64)
+            if structuralSimilarity(reference, decoded) >= params['targetSSIM']:
+                high = mid
+            else:
+                low = mid + 1
+    return encode(low)
+
+def saveTileRow(strip, f, level, i, occupied, params):
+    '''
+    Crop and save row i of tiles from a horizontal strip of a cube face level,
+    with any alpha channel already flattened, skipping the tiles that aren't
+    occupied. Returns the skipped tiles, the sizes of the saved tile files
+    (or, unless they're written directly to the output directory, the encoded
+    tiles themselves), the content hash of each saved tile if deduplicating,
+    and the process ID and timings of each stage, for Profile. This runs in worker
+    processes when tiles are encoded in parallel.
+    '''
+    tileSize = params['tileSize']
+    size = strip.size[0]
+    tiles = int(math.ceil(float(size) / tileSize))
+    missingTiles = []
+    savedTiles = {}
+    hashes = {}
+    spans = []
+    for j in range(0, tiles):
+        if not occupied[j]:
+            missingTiles.append((f, level, j, i))
+            continue
+        left = j * tileSize
+        upper = i * tileSize
+        right = min(j * tileSize + tileSize, size) # min(...) not really needed
+        lower = upper + strip.size[1]
+        start = time.perf_counter()
+        tile = strip.crop([left, 0, right, strip.size[1]])
+        spans.append(('crop', start, time.perf_counter()))
+        if params['debug']:
+            print('level: '+ str(level) + ' tiles: '+ str(tiles) + ' tileSize: ' + str(tileSize) + ' size: '+ str(size))
+            print('left: '+ str(left) + ' upper: '+ str(upper) + ' right: '+ str(right) + ' lower: '+ str(lower))
+        name = str(level) + '/' + faceLetters[f] + str(i) + '_' + str(j) + params['extension']
+        start = time.perf_counter()
+        data = encodeTileSearch(tile, params)
+        spans.append(('encode', start, time.perf_counter()))
+        if params['dedup']:
+            hashes[name] = hashlib.sha256(data).hexdigest()[:16]
+        if not params['direct']:
+            savedTiles[name] = data
+            continue
+        start = time.perf_counter()
+        with open(os.path.join(params['output'], name), 'wb') as tileFile:
+            tileFile.write(data)
+        spans.append(('write', start, time.perf_counter()))
+        savedTiles[name] = len(data)
+    return missingTiles, savedTiles, hashes, (os.getpid(), spans)
+
+def pruneMissingTiles(missingTiles):
+    '''
+    Remove missing tiles whose parent tile is also missing, since they won't
+    be loaded anyway, returning the remaining tiles in sorted order.
+    '''
+    missing = set(missingTiles)
+    return sorted(t for t in missing if (t[0], t[1] - 1, t[2] // 2, t[3] // 2) not in missing)
+
+def encodeMissingTiles(missingTiles, cubeSize, tileSize, levels):
+    '''
+    Encode sorted list of missing tiles as a string for the viewer.
+    '''
+    result = []
     prevFace = prevLevel = None
-    for missingTile in sorted(missingTiles):
+    for missingTile in missingTiles:
         face = missingTile[0]
         level = missingTile[1]
         if face != prevFace:
-            missingTilesStr += '!' + faceLetters[face]
+            result.append('!' + faceLetters[face])
         if level != prevLevel:
-            missingTilesStr += '>' + b83encode([level], 1)
+            result.append('>' + b83encode([level], 1))
             maxTileNum = math.ceil(cubeSize / 2**(levels - level) / tileSize) - 1
             numTileDigits = math.ceil(math.log(maxTileNum + 1, 83))
-        missingTilesStr += b83encode(missingTile[2:], numTileDigits)
+        result.append(b83encode(missingTile[2:], numTileDigits))
         prevFace = face
         prevLevel = level
+    return ''.join(result)
 
-# Generate fallback tiles
-if args.fallbackSize > 0:
-    print('Generating fallback tiles...')
-    for f in range(0, 6):
-        if not os.path.exists(os.path.join(args.output, 'fallback')):
-            os.makedirs(os.path.join(args.output, 'fallback'))
-        if os.path.exists(os.path.join(args.output, faces[f])):
-            face = Image.open(os.path.join(args.output, faces[f]))
-            if face.mode in ('RGBA', 'LA'):
-                background = Image.new(face.mode[:-1], face.size, colorTuple)
-                background.paste(face, face.split()[-1])
-                face = background
-            face = face.resize([args.fallbackSize, args.fallbackSize], ANTIALIAS)
-            face.save(os.path.join(args.output, 'fallback', faceLetters[f] + extension), quality = args.quality)
-
-# Clean up temporary files
-if not args.debug:
-    os.remove(os.path.join(args.output, 'cubic.pto'))
-    for face in faces:
-        if os.path.exists(os.path.join(args.output, face)):
-            os.remove(os.path.join(args.output, face))
-
-# Generate preview (but not for partial panoramas)
-if genPreview:
-    # Generate SHT-hash preview
-    shtHash = img2shtHash(np.array(Image.open(args.inputFile).resize((1024, 512))))
-if args.thumbnailSize > 0:
-    # Create low-resolution base64-encoded equirectangular preview image
-    img = Image.open(args.inputFile)
-    img = img.resize((args.thumbnailSize, args.thumbnailSize // 2))
-    buf = io.BytesIO()
-    img.save(buf, format='JPEG', quality=75, optimize=True)
-    equiPreview = bytes('data:image/jpeg;base64,', encoding='utf-8')
-    equiPreview += base64.b64encode(buf.getvalue())
-    equiPreview = equiPreview.decode()
-
-# Generate config file
-text = []
-text.append('{')
-text.append('    "hfov": ' + str(args.hfov)+ ',')
-if haov < 360:
-    text.append('    "haov": ' + str(haov)+ ',')
-    text.append('    "minYaw": ' + str(-haov/2+0)+ ',')
-    text.append('       "yaw": ' + str(-haov/2+args.hfov/2)+ ',')
-    text.append('    "maxYaw": ' + str(+haov/2+0)+ ',')
-if vaov < 180:
-    text.append('    "vaov": '    + str(vaov)+ ',')
-    text.append('    "vOffset": ' + str(args.vOffset)+ ',')
-    text.append('    "minPitch": ' + str(-vaov/2+args.vOffset)+ ',')
-    text.append('       "pitch": ' + str(        args.vOffset)+ ',')
-    text.append('    "maxPitch": ' + str(+vaov/2+args.vOffset)+ ',')
-if colorTuple != (0, 0, 0):
-    text.append('    "backgroundColor": ' + args.backgroundColor+ ',')
-if args.avoidbackground and (haov < 360 or vaov < 180):
-    text.append('    "avoidShowingBackground": true,')
-if args.autoload:
-    text.append('    "autoLoad": true,')
-text.append('    "type": "multires",')
-text.append('    "multiRes": {')
-if genPreview:
-    text.append('        "shtHash": "' + shtHash + '",')
-if args.thumbnailSize > 0:
-    text.append('        "equirectangularThumbnail": "' + equiPreview + '",')
-if len(missingTiles) > 0:
-    text.append('        "missingTiles": "' + missingTilesStr + '",')
-text.append('        "path": "/%l/%s%y_%x",')
-if args.fallbackSize > 0:
-    text.append('        "fallbackPath": "/fallback/%s",')
-text.append('        "extension": "' + extension[1:] + '",')
-text.append('        "tileResolution": ' + str(tileSize) + ',')
-text.append('        "maxLevel": ' + str(levels) + ',')
-text.append('        "cubeResolution": ' + str(cubeSize))
-text.append('    }')
-text.append('}')
-text = '\n'.join(text)
-with open(os.path.join(args.output, 'config.json'), 'w') as f:
-    f.write(text)
+def prefetchTiles(config, width, height, missingTiles):
+    '''
+    Choose the tiles of a tile set's initial view for a viewer of the given
+    size, as [face, level, x, y] lists in the order in which the viewer
+    requests them, skipping tiles that weren't saved.
+    '''
+    missing = set((faceLetters[t[0]],) + tuple(t[1:]) for t in missingTiles)
+    tiles = []
+    for node in multires.initialViewNodes(multires.TileSet(config), width, height):
+        if not any((node.side, node.level - k, node.x >> k, node.y >> k) in missing
+                   for k in range(node.level)):
+            tiles.append([node.side, node.level, node.x, node.y])
+    return tiles
+
+def preloadHtml(config, tiles, baseUrl):
+    '''
+    Format <link rel=preload> elements for prefetched tiles. For packed tile
+    archives, whose tiles are loaded with range requests, the indexes of their
+    levels are preloaded instead.
+    '''
+    tileSet = multires.TileSet(config)
+    urls = []
+    for side, level, x, y in tiles:
+        if tileSet.archivePath is not None:
+            url = tileSet.archivePath.replace('%l', str(level), 1) + '.idx'
+        else:
+            url = tileSet.url(multires.Node(tileSet, None, side, level, x, y, None))
+        if url not in urls:
+            urls.append(url)
+    return ''.join('<link rel="preload" href="' + html.escape(baseUrl + url) +
+                   '" as="fetch" crossorigin="anonymous">\n' for url in urls)
+
+class PngStrips(object):
+    '''
+    Decode the rows of a non-interlaced PNG image in order, a strip at a time.
+    The compressed data is inflated as it's read, and each strip's filtered
+    rows are unfiltered by Pillow, as a small PNG image of their bytes,
+    preceded by the unfiltered row above them, which the filters refer to.
+    Images with more than four bytes per pixel (16-bit RGB or RGBA), whose
+    bytes can't be unfiltered this way, aren't supported.
+    '''
+    # Color types of 8-bit images with each number of bytes per pixel
+    byteColorTypes = {1: 0, 2: 4, 3: 2, 4: 6}
+
+    def __init__(self, path, img):
+        self.file = open(path, 'rb')
+        self.file.seek(8)
+        length, self.chunkType = struct.unpack('>I4s', self.file.read(8))
+        header = self.file.read(length + 4)
+        self.width, _, depth, colorType, _, _, interlace = struct.unpack('>IIBBBBB', header[:13])
+        bits = depth * {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[colorType]
+        self.bytesPerPixel = max(1, bits // 8)
+        if interlace or self.bytesPerPixel not in self.byteColorTypes:
+            self.file.close()
+            raise ValueError('PNG image is interlaced or has more than four bytes per pixel')
+        self.rowBytes = (self.width * bits + 7) // 8
+        self.mode = img.mode
+        self.rawmode = img.tile[0][3]
+        self.palette = img.getpalette() if img.mode == 'P' else None
+        self.previous = bytes(self.rowBytes)
+        self.inflater = zlib.decompressobj()
+        self.chunkLeft = 0
+        self.data = bytearray()
+
+    def compressed(self):
+        '''
+        Read the next part of the image data, which is split between IDAT
+        chunks, or return None after the last one.
+        '''
+        while self.chunkLeft == 0:
+            if self.chunkType == b'IDAT':
+                self.file.read(4)  # CRC
+            length, self.chunkType = struct.unpack('>I4s', self.file.read(8))
+            if self.chunkType == b'IDAT':
+                self.chunkLeft = length
+            elif self.chunkType == b'IEND':
+                return None
+            else:
+                self.file.seek(length + 4, 1)
+        data = self.file.read(min(self.chunkLeft, 2**20))
+        self.chunkLeft -= len(data)
+        return data or None
+
+    def read(self, y, rows):
+        '''
+        Decode the next rows of the image.
+        '''
+        size = rows * (self.rowBytes + 1)
+        while len(self.data) < size:
+            data = self.inflater.unconsumed_tail or self.compressed()
+            if data is None:
+                raise ValueError('PNG image data ends early')
+            self.data += self.inflater.decompress(data, size - len(self.data))
+        filtered = bytes(self.data[:size])
+        del self.data[:size]
+
+        # Unfilter the rows as an 8-bit image with the same bytes per pixel
+        width = self.rowBytes // self.bytesPerPixel
+        header = struct.pack('>IIBBBBB', width, rows + 1, 8, self.byteColorTypes[self.bytesPerPixel], 0, 0, 0)
+        data = zlib.compress(b'\0' + self.previous + filtered, 0)
+        png = [b'\x89PNG\r\n\x1a\n']
+        for chunkType, chunk in ((b'IHDR', header), (b'IDAT', data), (b'IEND', b'')):
+            png.append(struct.pack('>I', len(chunk)) + chunkType + chunk +
+                       struct.pack('>I', zlib.crc32(chunkType + chunk)))
+        with Image.open(io.BytesIO(b''.join(png))) as img:
+            unfiltered = np.asarray(img).reshape(rows + 1, self.rowBytes)
+        self.previous = unfiltered[-1].tobytes()
+        strip = Image.frombytes(self.mode, (self.width, rows), unfiltered[1:].tobytes(), 'raw', self.rawmode)
+        if self.palette is not None:
+            strip.putpalette(self.palette)
+        return strip
+
+    def close(self):
+        self.file.close()
+
+class RawStrips(object):
+    '''
+    Decode the rows of an image stored uncompressed (e.g., an uncompressed
+    TIFF, BMP, or PPM image) a strip at a time, by reading only the rows of
+    each of its tiles that are part of the strip.
+    '''
+    def __init__(self, path, img):
+        self.tiles = []
+        for _, (x0, y0, x1, y1), offset, args in img.tile:
+            args = (args,) if isinstance(args, str) else tuple(args)
+            rawmode, stride, orientation = args + (0, 1)[len(args) - 1:]
+            if stride == 0:
+                # Rows aren't padded, so their length is that of packed rows
+                stride = len(Image.new(img.mode, (x1 - x0, 1)).tobytes('raw', rawmode))
+            self.tiles.append(((x0, y0, x1, y1), offset, rawmode, stride, orientation))
+        self.mode = img.mode
+        self.width = img.size[0]
+        self.palette = img.getpalette() if img.mode == 'P' else None
+        self.file = open(path, 'rb')
+
+    def read(self, y, rows):
+        '''
+        Decode rows y to y + rows of the image.
+        '''
+        strip = Image.new(self.mode, (self.width, rows))
+        for (x0, y0, x1, y1), offset, rawmode, stride, orientation in self.tiles:
+            start = max(y, y0) - y0
+            end = min(y + rows, y1) - y0
+            if start >= end:
+                continue
+            # Rows of tiles stored bottom-up are in reverse order
+            self.file.seek(offset + (start if orientation > 0 else y1 - y0 - end) * stride)
+            data = self.file.read((end - start) * stride)
+            strip.paste(Image.frombytes(self.mode, (x1 - x0, end - start), data, 'raw',
+                                        rawmode, stride, orientation), (x0, y0 + start - y))
+        if self.palette is not None:
+            strip.putpalette(self.palette)
+        return strip
+
+    def close(self):
+        self.file.close()
+
+class ImageSource(object):
+    '''
+    Input panorama, shared by everything that needs its pixels. The header is
+    read once, the full-resolution image is decoded at most once, and previews
+    are resized from a cached reduced-resolution copy, which, for JPEG images,
+    is decoded directly at a reduced scale in the DCT domain and, otherwise, is
+    box-filtered down by an integer factor a strip at a time, as the image is
+    decoded, so a full-resolution copy is never made for it.
+    '''
+    def __init__(self, path, previewSize=(1024, 512)):
+        self.path = path
+        with Image.open(path) as img:
+            self.size = img.size
+            self.format = img.format
+            self.mode = 'RGBA' if img.mode in ('RGBA', 'LA', 'PA') else 'RGB'
+        self.full = None
+        self.reduced = None
+        # Reduced-resolution copy is at least this large, e.g., enough for the
+        # SHT hash and thumbnail
+        self.previewSize = previewSize
+
+    def open(self):
+        return Image.open(self.path)
+
+    def stripReader(self):
+        '''
+        Open a reader that decodes the image a strip at a time, or return None
+        if the image's format or encoding doesn't allow this, e.g., for JPEG
+        and compressed TIFF images, which Pillow only decodes whole.
+        '''
+        with self.open() as img:
+            try:
+                if img.format == 'PNG' and len(img.tile) == 1:
+                    return PngStrips(self.path, img)
+                if all(tile[0] == 'raw' for tile in img.tile):
+                    return RawStrips(self.path, img)
+            except (ValueError, KeyError):
+                pass
+        return None
+
+    def decodesInStrips(self):
+        reader = self.stripReader()
+        if reader is not None:
+            reader.close()
+        return reader is not None
+
+    def reduction(self):
+        '''
+        Largest integer factor the image can be reduced by while still covering
+        the preview size.
+        '''
+        return max(1, min(self.size[0] // self.previewSize[0], self.size[1] // self.previewSize[1]))
+
+    def strips(self, rows):
+        '''
+        Decode the full-resolution image, in RGB or RGBA mode, yielding the
+        first row and array of each strip of at least the given number of rows.
+        Images that can't be decoded a strip at a time are decoded whole first.
+        Unless it's already cached, the reduced-resolution copy is built from
+        the strips as they're decoded.
+        '''
+        factor = None
+        if self.reduced is None and self.format != 'JPEG':
+            # Strips are a whole number of reduced rows, so each can be reduced
+            # on its own
+            factor = self.reduction()
+            rows = -(-rows // factor) * factor
+            pieces = []
+        for y, strip in self.decode(rows):
+            if factor is not None:
+                pieces.append(np.asarray(Image.fromarray(strip).convert('RGB').reduce(factor)))
+            yield y, strip
+        if factor is not None:
+            self.reduced = Image.fromarray(np.concatenate(pieces))
+
+    def decode(self, rows):
+        '''
+        Decode the full-resolution image in strips, from the cached copy if
+        there's one.
+        '''
+        full = self.full
+        reader = None if full is not None else self.stripReader()
+        if reader is None:
+            if full is None:
+                with self.open() as img:
+                    full = np.asarray(img.convert(self.mode))
+            for y in range(0, self.size[1], rows):
+                yield y, full[y:y + rows]
+            return
+        try:
+            for y in range(0, self.size[1], rows):
+                yield y, np.asarray(reader.read(y, min(rows, self.size[1] - y)).convert(self.mode))
+        finally:
+            reader.close()
+
+    def array(self):
+        '''
+        Decode the full-resolution image, in RGB or RGBA mode, as an array.
+        '''
+        if self.full is None:
+            with self.open() as img:
+                self.full = np.asarray(img.convert(self.mode))
+        return self.full
+
+    def preview(self, width, height):
+        '''
+        Resize the image to a preview size, in RGB mode.
+        '''
+        if width > self.previewSize[0] or height > self.previewSize[1]:
+            self.previewSize = (max(width, self.previewSize[0]), max(height, self.previewSize[1]))
+            self.reduced = None
+        if self.reduced is None:
+            if self.format == 'JPEG':
+                with self.open() as img:
+                    # Decode at the smallest scale that's still at least as large
+                    img.draft('RGB', self.previewSize)
+                    self.reduced = img.convert('RGB')
+            else:
+                for _ in self.strips(max(1, 2**22 // self.size[0])):
+                    pass
+        return self.reduced.resize((width, height))
+
+def fileHash(path):
+    '''
+    Calculate SHA-256 hash of a file's contents.
+    '''
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class Profile(object):
+    '''
+    Time spent in each stage of generating a tile set. Stages can be nested,
+    in which case only the time not spent in nested stages is counted for
+    each stage. If tracing, every stage, as well as every face and level, is
+    also recorded as a Chrome trace event.
+    '''
+    def __init__(self, trace=False):
+        self.times = collections.OrderedDict()
+        self.calls = collections.defaultdict(int)
+        self.events = [] if trace else None
+        self.stack = []
+        self.origin = time.perf_counter()
+
+    def begin(self, name):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def end(self, name):
+        _, start, nested = self.stack.pop()
+        now = time.perf_counter()
+        self.record(name, start, now, nested)
+        if self.stack:
+            self.stack[-1][2] += now - start
+
+    def record(self, name, start, end, nested=0.0, pid=None):
+        self.times[name] = self.times.get(name, 0) + end - start - nested
+        self.calls[name] += 1
+        if self.events is not None:
+            self.event(name, 'stage', start, end, pid)
+
+    def event(self, name, category, start, end, pid=None, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid or os.getpid(), 'tid': 0,
+                 'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def add(self, spans, pid, inProcess):
+        '''
+        Record stages timed by saveTileRow, possibly in a worker process.
+        '''
+        for name, start, end in spans:
+            self.record(name, start, end, pid=pid)
+            if inProcess and self.stack:
+                self.stack[-1][2] += end - start
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    @contextlib.contextmanager
+    def batch(self, name, **args):
+        '''
+        Group stages, e.g., those of a face or level, in the trace.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.events is not None:
+                self.event(name, 'batch', start, time.perf_counter(), args=args)
+
+    def summary(self):
+        '''
+        Print the time spent in each stage.
+        '''
+        wall = time.perf_counter() - self.origin
+        total = sum(self.times.values())
+        print('stage         calls   seconds  percent')
+        for name, seconds in self.times.items():
+            print('%-12s  %5d  %8.3f  %6.1f%%' % (name, self.calls[name], seconds,
+                  100 * seconds / total if total > 0 else 0))
+        print('%-12s  %5s  %8.3f' % ('wall time', '', wall))
+        if total > wall * 1.05:
+            print('Stage times include time spent in parallel worker processes.')
+
+    def writeTrace(self, path):
+        '''
+        Write the recorded events as a Chrome trace, which can be viewed with
+        chrome://tracing or https://ui.perfetto.dev/.
+        '''
+        processes = sorted(set(event['pid'] for event in self.events))
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                     'args': {'name': 'generate.py' if pid == os.getpid() else 'tile worker'}}
+                    for pid in processes]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, f)
+
+class Manifest(object):
+    '''
+    Append-only JSON Lines record of the source image hash, the parameters
+    that affect the output, and each finished row of tiles, fallback tile,
+    and preview of a tile set, which allows an interrupted run to be resumed.
+    '''
+    def __init__(self, path, sourceHash, params, resume=False, archive=False):
+        self.rows = {}
+        self.archive = archive
+        self.missingFaces = set()
+        self.fallbacks = set()
+        self.values = {}
+        self.output = os.path.dirname(path)
+        header = json.loads(json.dumps({'source': sourceHash, 'params': params}))
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                lines = f.read().splitlines()
+            if not lines or json.loads(lines[0]) != header:
+                raise ValueError('source image or parameters differ from those of the run being resumed')
+            for line in lines[1:]:
+                try:
+                    self.load(json.loads(line))
+                except ValueError:
+                    pass  # Ignore line partially written when interrupted
+            self.file = open(path, 'a')
+        else:
+            self.file = open(path, 'w')
+            self.write(header)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def valid(self, name, size):
+        '''
+        Check that a file recorded as finished is still intact.
+        '''
+        path = os.path.join(self.output, name)
+        return os.path.exists(path) and os.path.getsize(path) == size
+
+    def load(self, record):
+        if 'row' in record:
+            # Tiles in packed archives are checked by TileArchive instead
+            if self.archive or all(self.valid(n, s) for n, s in record['tiles'].items()):
+                self.rows[tuple(record['row'])] = ([tuple(t) for t in record['missing']], record['tiles'],
+                                                   record.get('aliases', {}), record.get('hashes', {}))
+        elif 'face' in record:
+            self.missingFaces.add(record['face'])
+        elif 'fallback' in record:
+            if self.valid(record['fallback'], record['bytes']):
+                self.fallbacks.add(record['fallback'])
+        elif 'key' in record:
+            self.values[record['key']] = record['value']
+
+    def rowDone(self, f, level, i):
+        return (f, level, i) in self.rows
+
+    def addRow(self, f, level, i, missingTiles, savedTiles, aliases, hashes):
+        self.rows[(f, level, i)] = (missingTiles, savedTiles, aliases, hashes)
+        record = {'row': [f, level, i], 'missing': missingTiles, 'tiles': savedTiles}
+        if aliases:
+            record['aliases'] = aliases
+        if hashes:
+            record['hashes'] = hashes
+        self.write(record)
+
+    def addMissingFace(self, f):
+        self.missingFaces.add(f)
+        self.write({'face': f})
+
+    def fallbackDone(self, name):
+        return name in self.fallbacks
+
+    def addFallback(self, name, size):
+        self.fallbacks.add(name)
+        self.write({'fallback': name, 'bytes': size})
+
+    def addValue(self, key, value):
+        self.values[key] = value
+        self.write({'key': key, 'value': value})
+
+    def missingTiles(self):
+        '''
+        List all empty tiles and missing faces, in a deterministic order.
+        '''
+        missingTiles = [(f, 1, 0, 0) for f in sorted(self.missingFaces)]
+        for key in sorted(self.rows):
+            missingTiles += self.rows[key][0]
+        return missingTiles
+
+    def levelBytes(self):
+        '''
+        Count the saved tile files and their total size in bytes for each
+        level, counting identical, deduplicated tiles once.
+        '''
+        levels = collections.defaultdict(dict)
+        for (f, level, i), row in self.rows.items():
+            levels[level].update(row[1])
+        return {level: (len(files), sum(files.values())) for level, files in levels.items()}
+
+    def distinctTiles(self):
+        '''
+        Map the content hash of each saved tile of deduplicated tiles to the
+        tile's file name.
+        '''
+        return {h: name for row in self.rows.values() for name, h in row[3].items()}
+
+    def tileAliases(self, cubeSize, tileSize, levels):
+        '''
+        Encode the deduplicated tiles that use the file of an identical tile,
+        using the same base 83 encoding as the SHT hash, as the number of
+        digits per tile followed by pairs of the number of such a tile and the
+        number of the tile whose file it uses, ordered by tile, with tiles
+        numbered in level, face, row, and column order. Returns None if no
+        tiles are deduplicated.
+        '''
+        offsets = {}
+        tiles = {}
+        offset = 0
+        for level, size in zip(range(levels, 0, -1), pyramidSizes(cubeSize, levels)):
+            tiles[level] = int(math.ceil(float(size) / tileSize))
+        for level in range(1, levels + 1):
+            offsets[level] = offset
+            offset += 6 * tiles[level] ** 2
+
+        def number(name):
+            level, name = name.split('/')
+            i, j = name[1:name.index('.')].split('_')
+            n = tiles[int(level)]
+            return offsets[int(level)] + (faceLetters.index(name[0]) * n + int(i)) * n + int(j)
+
+        pairs = sorted((number(name), number(shared)) for row in self.rows.values()
+                       for name, shared in row[2].items())
+        if len(pairs) == 0:
+            return None
+        digits = 1
+        while 83 ** digits < offset:
+            digits += 1
+        return b83encode([digits], 1) + b83encode([n for pair in pairs for n in pair], digits)
+
+    def close(self):
+        self.file.close()
+
+class TileArchive(object):
+    '''
+    Packed tile archives, one per level, each holding the encoded tiles of a
+    level back to back in face, row, column order. A matching index file holds
+    the number of tiles along each side of a face followed by the length of
+    each tile (zero for missing tiles), as little-endian 32-bit integers, so
+    the viewer can fetch tiles with HTTP range requests.
+    '''
+    def __init__(self, output, cubeSize, tileSize, levels, manifest):
+        self.output = output
+        self.manifest = manifest
+        self.tiles = {}
+        self.files = {}
+        size = cubeSize
+        for level in range(levels, 0, -1):
+            self.tiles[level] = int(math.ceil(float(size) / tileSize))
+            size = int(size / 2)
+
+            # Rows of a level are finished in order, so the tiles of rows
+            # recorded by an interrupted run are at the start of its archive
+            path = self.path(level, '.pack')
+            rows = [key for key in manifest.rows if key[1] == level]
+            length = sum(sum(manifest.rows[key][1].values()) for key in rows)
+            if not os.path.exists(path) or os.path.getsize(path) < length:
+                for key in rows:
+                    del manifest.rows[key]
+                length = 0
+            self.files[level] = open(path, 'ab')
+            self.files[level].truncate(length)
+
+    def path(self, level, extension):
+        return os.path.join(self.output, str(level) + extension)
+
+    def add(self, level, savedTiles):
+        '''
+        Append encoded tiles to the archive of a level, returning their sizes.
+        '''
+        for data in savedTiles.values():
+            self.files[level].write(data)
+        self.files[level].flush()
+        return {name: len(data) for name, data in savedTiles.items()}
+
+    def close(self):
+        '''
+        Close the archives and write their indices.
+        '''
+        for level, tiles in self.tiles.items():
+            self.files[level].close()
+            lengths = np.zeros((6, tiles, tiles), dtype='<u4')
+            for (f, l, i), row in self.manifest.rows.items():
+                if l == level:
+                    for name, size in row[1].items():
+                        lengths[f, i, int(name[name.index('_') + 1:name.rindex('.')])] = size
+            with open(self.path(level, '.idx'), 'wb') as f:
+                f.write(np.array([tiles], dtype='<u4').tobytes())
+                f.write(lengths.tobytes())
+
+class TileSink(object):
+    '''
+    Destination for the files of a tile set (tiles, fallback tiles, and
+    config.json), given as relative paths using forward slashes. Sinks that
+    are used by AsyncSink must allow write() to be called from several threads
+    at once.
+    '''
+    def write(self, name, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class DirectorySink(TileSink):
+    '''
+    Write files into a directory. Each file is written to a temporary file
+    first, so an interrupted run never leaves a partial file under its name.
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, name, data):
+        path = os.path.join(self.path, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = path + '.' + str(os.getpid()) + '-' + str(threading.get_ident())
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+
+class TarSink(TileSink):
+    '''
+    Write files into a tar archive, compressed with gzip if its name ends with
+    .tar.gz or .tgz.
+    '''
+    def __init__(self, path):
+        mode = 'w:gz' if path.endswith(('.tar.gz', '.tgz')) else 'w'
+        self.tar = tarfile.open(path, mode)
+        self.time = time.time()
+        self.lock = threading.Lock()
+
+    def write(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self.time
+        with self.lock:
+            self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+
+class ZipSink(TileSink):
+    '''
+    Write files into a zip archive, without compressing them further, since
+    the tiles are already compressed.
+    '''
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+        self.time = time.localtime()[:6]
+        self.lock = threading.Lock()
+
+    def write(self, name, data):
+        with self.lock:
+            self.zip.writestr(zipfile.ZipInfo(name, self.time), data)
+
+    def close(self):
+        self.zip.close()
+
+class MemorySink(TileSink):
+    '''
+    Keep files in memory, in the files dict, e.g., for embedding the
+    generator in another program.
+    '''
+    def __init__(self):
+        self.files = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def write(self, name, data):
+        with self.lock:
+            self.files[name] = data
+
+class S3Sink(TileSink):
+    '''
+    Upload files to an S3-compatible object store, given as
+    s3://bucket/prefix, with path-style PUT requests to an endpoint URL
+    (defaulting to the AWS_ENDPOINT_URL environment variable or AWS). The
+    requests are signed with AWS Signature Version 4 if the AWS_ACCESS_KEY_ID
+    and AWS_SECRET_ACCESS_KEY environment variables are set, and unsigned
+    otherwise, e.g., for a local stand-in server.
+    '''
+    def __init__(self, url, endpoint=None):
+        parts = urllib.parse.urlsplit(url)
+        self.bucket = parts.netloc
+        self.prefix = parts.path.strip('/')
+        self.endpoint = (endpoint or os.environ.get('AWS_ENDPOINT_URL') or 'https://s3.amazonaws.com').rstrip('/')
+        self.region = os.environ.get('AWS_REGION', os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+        self.accessKey = os.environ.get('AWS_ACCESS_KEY_ID')
+        self.secretKey = os.environ.get('AWS_SECRET_ACCESS_KEY')
+        self.sessionToken = os.environ.get('AWS_SESSION_TOKEN')
+
+    def contentType(self, name):
+        ext = os.path.splitext(name)[1]
+        for _, (tileExt, fmt) in tileFormats.items():
+            if ext == tileExt:
+                return 'image/' + fmt.lower()
+        return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    def sign(self, method, url, headers, data):
+        '''
+        Add AWS Signature Version 4 authorization headers to a request.
+        '''
+        now = datetime.datetime.now(datetime.timezone.utc)
+        amzDate = now.strftime('%Y%m%dT%H%M%SZ')
+        scope = amzDate[:8] + '/' + self.region + '/s3/aws4_request'
+        parts = urllib.parse.urlsplit(url)
+        headers['x-amz-content-sha256'] = hashlib.sha256(data).hexdigest()
+        headers['x-amz-date'] = amzDate
+        if self.sessionToken:
+            headers['x-amz-security-token'] = self.sessionToken
+        signed = {k.lower(): str(v).strip() for k, v in headers.items()}
+        signed['host'] = parts.netloc
+        names = sorted(signed)
+        canonical = '\n'.join([method, parts.path, parts.query,
+                               ''.join(n + ':' + signed[n] + '\n' for n in names),
+                               ';'.join(names), headers['x-amz-content-sha256']])
+        stringToSign = '\n'.join(['AWS4-HMAC-SHA256', amzDate, scope,
+                                  hashlib.sha256(canonical.encode('utf-8')).hexdigest()])
+        key = ('AWS4' + self.secretKey).encode('utf-8')
+        for part in (amzDate[:8], self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(key, stringToSign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['Authorization'] = ('AWS4-HMAC-SHA256 Credential=' + self.accessKey + '/' + scope +
+                                    ', SignedHeaders=' + ';'.join(names) + ', Signature=' + signature)
+
+    def write(self, name, data):
+        key = '/'.join(p for p in (self.prefix, name) if p)
+        url = self.endpoint + '/' + self.bucket + '/' + urllib.parse.quote(key)
+        headers = {'Content-Type': self.contentType(name)}
+        if self.accessKey and self.secretKey:
+            self.sign('PUT', url, headers, data)
+        request = urllib.request.Request(url, data=data, headers=headers, method='PUT')
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+class AsyncSink(TileSink):
+    '''
+    Write files to another sink with a pool of writer threads, so writing
+    overlaps with encoding. Once maxPending writes are queued, write() blocks
+    until one finishes, which bounds the memory held by queued files. Errors
+    are raised by the next call to write() or close().
+    '''
+    def __init__(self, sink, threads, maxPending=None):
+        self.sink = sink
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+        self.slots = threading.BoundedSemaphore(maxPending or 4 * threads)
+        self.error = None
+
+    def done(self, future):
+        if future.exception() is not None and self.error is None:
+            self.error = future.exception()
+        self.slots.release()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def write(self, name, data):
+        self.check()
+        self.slots.acquire()
+        self.executor.submit(self.sink.write, name, data).add_done_callback(self.done)
+
+    def close(self):
+        self.executor.shutdown()
+        self.check()
+        self.sink.close()
+
+def isDirectoryOutput(output):
+    return not (output.startswith('s3://') or output.endswith(('.tar', '.tar.gz', '.tgz', '.zip')))
+
+def openSink(output, endpoint=None):
+    '''
+    Open the sink for an output location: an s3://bucket/prefix URL, a .tar,
+    .tar.gz, .tgz, or .zip archive, or else a directory.
+    '''
+    if output.startswith('s3://'):
+        return S3Sink(output, endpoint)
+    if output.endswith(('.tar', '.tar.gz', '.tgz')):
+        return TarSink(output)
+    if output.endswith('.zip'):
+        return ZipSink(output)
+    return DirectorySink(output)
+
+def argumentParser():
+    '''
+    Create the parser for the command line arguments.
+    '''
+    parser = argparse.ArgumentParser(description='Generate a Pannellum multires tile set from a full or partial equirectangular or cylindrical panorama.',
+                       formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('inputFile', metavar='INPUT',
+                        help='panorama to be processed, or, for batch mode, a directory of panoramas or a JSON file listing them')
+    parser.add_argument('-C', '--cylindrical', action='store_true',
+                        help='input projection is cylindrical (default is equirectangular)')
+    parser.add_argument('-H', '--haov', dest='haov', default=-1, type=float,
+                        help='horizontal angle of view (defaults to 360.0 for full panorama)')
+    parser.add_argument('-F', '--hfov', dest='hfov', default=100.0, type=float,
+                        help='starting horizontal field of view (defaults to 100.0)')
+    parser.add_argument('-V', '--vaov', dest='vaov', default=-1, type=float,
+                        help='vertical angle of view (defaults to 180.0 for full panorama)') 
+    parser.add_argument('-O', '--voffset', dest='vOffset', default=0.0, type=float,
+                        help='starting pitch position (defaults to 0.0)')
+    parser.add_argument('-e', '--horizon', dest='horizon', default=0.0, type=int,
+                        help='offset of the horizon in pixels (negative if above middle, defaults to 0)')
+    parser.add_argument('-o', '--output', dest='output', default='./output',
+                        help='output directory, optionally to be used as basePath, or a .tar, .tar.gz, .tgz, or .zip archive, or an s3://bucket/prefix URL (defaults to "./output")')
+    parser.add_argument('--s3-endpoint', dest='s3Endpoint', default=None, metavar='URL',
+                        help='endpoint of the S3-compatible object store for s3:// output (defaults to the AWS_ENDPOINT_URL environment variable or AWS)')
+    parser.add_argument('-s', '--tilesize', dest='tileSize', default=512, type=int,
+                        help='tile size in pixels')
+    parser.add_argument('-f', '--fallbacksize', dest='fallbackSize', default=1024, type=int,
+                        help='fallback tile size in pixels (defaults to 1024, set to 0 to skip)')
+    parser.add_argument('-c', '--cubesize', dest='cubeSize', default=0, type=int,
+                        help='cube size in pixels, or 0 to retain all details')
+    parser.add_argument('-b', '--backgroundcolor', dest='backgroundColor', default="[0.0, 0.0, 0.0]", type=str,
+                        help='RGB triple of values [0, 1] defining background color shown past the edges of a partial panorama (defaults to "[0.0, 0.0, 0.0]")')
+    parser.add_argument('-B', '--avoidbackground', action='store_true',
+                        help='viewer should limit view to avoid showing background, so using --backgroundcolor is not needed')
+    parser.add_argument('-a', '--autoload', action='store_true',
+                        help='automatically load panorama in viewer')
+    parser.add_argument('-q', '--quality', dest='quality', default=75, type=int,
+                        help='output quality 0-100 for lossy tile formats (the maximum quality when searching for a quality per tile)')
+    parser.add_argument('--format', dest='format', default='jpeg', choices=availableTileFormats(),
+                        help='tile image format')
+    parser.add_argument('--png', action='store_true',
+                        help='output PNG tiles instead of JPEG tiles (same as --format png)')
+    parser.add_argument('--progressive', action='store_true',
+                        help='save progressive JPEG tiles')
+    parser.add_argument('--optimize', action='store_true',
+                        help='optimize the encoding of JPEG or PNG tiles, which makes them smaller but is slower')
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument('--target-bytes', dest='targetBytes', default=0, type=int,
+                        help='choose the highest quality for each tile, up to --quality, that fits in this many bytes (lossy formats only)')
+    search.add_argument('--target-ssim', dest='targetSSIM', default=0.0, type=float,
+                        help='choose the lowest quality for each tile that reaches this structural similarity (SSIM) to the uncompressed tile, e.g., 0.95 (lossy formats only)')
+    parser.add_argument('--thumbnailsize', dest='thumbnailSize', default=0, type=int,
+                        help='width of equirectangular thumbnail preview (defaults to no thumbnail; must be power of two; >512 not recommended)')
+    parser.add_argument('--prefetch', dest='prefetch', nargs='?', const='1280x720', default=None, metavar='WIDTHxHEIGHT',
+                        help='list the tiles of the initial view in config.json, in the order the viewer needs them, so that it can request them as soon as the config is loaded; the tiles are chosen for a viewer of this size in device pixels (defaults to 1280x720 if no size is given)')
+    parser.add_argument('--preload-html', dest='preloadHtml', nargs='?', const='.', default=None, metavar='BASEURL',
+                        help='also write the prefetched tiles as <link rel=preload> elements to preload.html, with their URLs relative to BASEURL, the URL of the tile set (defaults to "." if not given)')
+    parser.add_argument('-i', '--interpolation', default='bicubic',
+                        choices=['bilinear', 'bicubic'],
+                        help='interpolation used by the built-in cube face remapper')
+    parser.add_argument('--downsampling', default='lanczos',
+                        choices=['lanczos', 'box'],
+                        help='filter used to make each level from the level above: Lanczos, or faster 2x2 box averaging')
+    parser.add_argument('--prune-detail', dest='pruneDetail', default=0.0, type=float,
+                        help='leave out tiles of the deepest level whose root-mean-square difference from their upsampled parent tile, in 8-bit levels, is below this threshold, e.g., 2, so the viewer shows the parent tile instead, or 0 to keep all tiles')
+    parser.add_argument('--remapper', dest='remapper', default=None, choices=['builtin', 'nona'],
+                        help='cube face remapper: the built-in one, or nona (from Hugin); defaults to nona if --nona or --gpu is given, and to the built-in one otherwise')
+    parser.add_argument('-n', '--nona', default=None,
+                        metavar='EXECUTABLE',
+                        help='location of the nona executable to use (defaults to the one on the PATH; implies --remapper nona)')
+    parser.add_argument('-G', '--gpu', action='store_true',
+                        help='perform image remapping by nona on the GPU (implies --remapper nona)')
+    parser.add_argument('-w', '--workers', dest='workers', default=1, type=int,
+                        help='number of processes used to encode tiles (or, in batch mode, to process panoramas) in parallel, or 0 to use all CPUs')
+    parser.add_argument('--writers', dest='writers', default=4, type=int,
+                        help='number of threads writing files to the output while tiles are encoded, or 0 to write them synchronously')
+    parser.add_argument('--max-faces', dest='maxFaces', default=2, type=int,
+                        help='maximum number of cube faces held in memory at once; while one face is tiled, the ones after it are reprojected in parallel, in background threads, up to this limit, or, if 1, each face is reprojected only when it is tiled')
+    parser.add_argument('-m', '--max-memory', dest='maxMemory', default=0, type=int,
+                        help='approximate memory budget in MiB for streaming mode, in which cube faces are rendered and tiled one strip at a time using scratch files in the output directory, or 0 to process whole cube faces in memory')
+    parser.add_argument('-A', '--archive', action='store_true',
+                        help='write the tiles of each level into a single packed archive with an index, for loading with HTTP range requests, instead of into separate files')
+    parser.add_argument('-D', '--dedup', action='store_true',
+                        help='save identical tiles once, under names based on their contents, along with a table of the tiles that use each one')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='resume an interrupted run in an existing output directory, skipping tiles that were already finished')
+    parser.add_argument('-p', '--profile', action='store_true',
+                        help='print the time spent in each stage of generating the tile set')
+    parser.add_argument('-t', '--trace', dest='trace', default=None, metavar='FILE',
+                        help='also record each stage, face, and level in a Chrome trace-event JSON file (in batch mode, one file per panorama, with the scene ID appended to the name)')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='debug mode (print status info and keep intermediate files)')
+    return parser
+
+def checkArgs(parser, args):
+    '''
+    Check parsed arguments and fill in the values that depend on others,
+    reporting errors with the parser.
+    '''
+    if args.remapper is None:
+        args.remapper = 'nona' if args.nona is not None or args.gpu else 'builtin'
+    if args.remapper == 'nona':
+        if args.nona is None:
+            args.nona = nona
+        if args.nona is None:
+            parser.error('the nona utility (from Hugin) was not found on the PATH, so its location must be specified with --nona EXECUTABLE')
+        if args.maxMemory > 0:
+            parser.error('streaming mode (--max-memory) requires the built-in remapper')
+    elif args.gpu:
+        parser.error('--gpu requires --remapper nona')
+    if args.png:
+        args.format = 'png'
+    if args.maxFaces < 1:
+        parser.error('--max-faces must be at least 1')
+    if args.pruneDetail > 0 and args.maxMemory > 0:
+        parser.error('--prune-detail cannot be combined with streaming mode (--max-memory)')
+    if args.dedup and args.archive:
+        parser.error('--dedup cannot be combined with --archive')
+    if args.progressive and args.format != 'jpeg':
+        parser.error('--progressive requires JPEG tiles')
+    if args.optimize and args.format not in ('jpeg', 'png'):
+        parser.error('--optimize requires JPEG or PNG tiles')
+    if (args.targetBytes or args.targetSSIM) and args.format not in lossyFormats:
+        parser.error('quality search requires a lossy tile format')
+    if args.prefetch is not None:
+        match = re.fullmatch(r'(\d+)x(\d+)', args.prefetch)
+        if match is None:
+            parser.error('--prefetch size must be given as WIDTHxHEIGHT, e.g., 1280x720')
+        args.prefetch = (int(match.group(1)), int(match.group(2)))
+    if args.preloadHtml is not None and args.prefetch is None:
+        parser.error('--preload-html requires --prefetch')
+    return args
+
+def parseArgs(argv=None):
+    '''
+    Parse command line arguments.
+    '''
+    parser = argumentParser()
+    return checkArgs(parser, parser.parse_args(argv))
+
+def tileSetLayout(args, origWidth, origHeight):
+    '''
+    Determine the horizontal and vertical angles of view, cube size, tile
+    size, and number of levels of the tile set for a panorama.
+    '''
+    haov = args.haov
+    if haov == -1:
+        if args.cylindrical or float(origWidth) / origHeight == 2:
+            print('Assuming --haov 360.0')
+            haov = 360.0
+        else:
+            raise GenerateError('Unless given the --haov option, equirectangular input image must be a full (not partial) panorama!')
+    vaov = args.vaov
+    if vaov == -1:
+        if args.cylindrical or float(origWidth) / origHeight == 2:
+            print('Assuming --vaov 180.0')
+            vaov = 180.0
+        else:
+            raise GenerateError('Unless given the --vaov option, equirectangular input image must be a full (not partial) panorama!')
+    if args.cubeSize != 0:
+        cubeSize = args.cubeSize
+    else:
+        cubeSize = 8 * int((360 / haov) * origWidth / math.pi / 8)
+    tileSize = min(args.tileSize, cubeSize)
+    levels = int(math.ceil(math.log(float(cubeSize) / tileSize, 2))) + 1
+    if int(cubeSize / 2**(levels - 2)) == tileSize:
+        levels -= 1  # Handle edge case
+    return haov, vaov, cubeSize, tileSize, levels
+
+def parseColor(value):
+    '''
+    Convert an RGB triple of values [0, 1], given as a string, to 8-bit values.
+    '''
+    colorList = ast.literal_eval(value)
+    return (int(colorList[0]*255), int(colorList[1]*255), int(colorList[2]*255))
+
+def configText(args, haov, vaov, colorTuple, multiRes):
+    '''
+    Format config.json for a tile set, given the entries of its multiRes
+    object.
+    '''
+    text = []
+    text.append('{')
+    text.append('    "hfov": ' + str(args.hfov)+ ',')
+    if haov < 360:
+        text.append('    "haov": ' + str(haov)+ ',')
+        text.append('    "minYaw": ' + str(-haov/2+0)+ ',')
+        text.append('       "yaw": ' + str(-haov/2+args.hfov/2)+ ',')
+        text.append('    "maxYaw": ' + str(+haov/2+0)+ ',')
+    if vaov < 180:
+        text.append('    "vaov": '    + str(vaov)+ ',')
+        text.append('    "vOffset": ' + str(args.vOffset)+ ',')
+        text.append('    "minPitch": ' + str(-vaov/2+args.vOffset)+ ',')
+        text.append('       "pitch": ' + str(        args.vOffset)+ ',')
+        text.append('    "maxPitch": ' + str(+vaov/2+args.vOffset)+ ',')
+    if colorTuple != (0, 0, 0):
+        text.append('    "backgroundColor": ' + args.backgroundColor+ ',')
+    if args.avoidbackground and (haov < 360 or vaov < 180):
+        text.append('    "avoidShowingBackground": true,')
+    if args.autoload:
+        text.append('    "autoLoad": true,')
+    text.append('    "type": "multires",')
+    text.append('    "multiRes": {')
+    text.append(',\n'.join('        ' + entry for entry in multiRes))
+    text.append('    }')
+    text.append('}')
+    return '\n'.join(text)
+
+def generate(args, profile=None, sink=None):
+    '''
+    Generate a multires tile set and its config.json for a single panorama,
+    optionally recording the time spent in each stage in a Profile. The files
+    are written to a TileSink, which is closed when done, or, by default, to
+    the sink for the --output location. Raises GenerateError, before anything
+    is written, if the input or options aren't usable.
+    '''
+    if profile is None:
+        profile = Profile(trace=args.trace is not None)
+    genPreview = True
+
+    # Check argument
+    if args.thumbnailSize > 0:
+        if args.thumbnailSize & (args.thumbnailSize - 1) != 0:
+            raise GenerateError('Thumbnail size, if specified, must be a power of two')
+    directory = isDirectoryOutput(args.output) if sink is None else isinstance(sink, DirectorySink)
+    path = sink.path if isinstance(sink, DirectorySink) else args.output
+    if not directory and (args.resume or args.archive):
+        raise GenerateError('--resume and --archive require an output directory')
+    if directory and os.path.exists(path) and not args.resume:
+        message = 'Output directory "' + path + '" already exists'
+        if not args.debug:
+            raise GenerateError(message)
+        print(message)
+
+    # Process input image information
+    print('Processing input image information...')
+    image = ImageSource(args.inputFile, (max(1024, args.thumbnailSize), max(512, args.thumbnailSize // 2)))
+    origWidth, origHeight = image.size
+    haov, vaov, cubeSize, tileSize, levels = tileSetLayout(args, origWidth, origHeight)
+    if sink is None:
+        sink = openSink(args.output, args.s3Endpoint)
+
+    # Working files (manifest, scratch files, and nona's cube faces) are kept
+    # in the output directory, or in a temporary directory for other sinks
+    if not isinstance(sink, DirectorySink):
+        output = tempfile.mkdtemp(prefix='generate')
+    elif os.path.exists(sink.path):
+        output = sink.path
+        if args.resume:
+            # Remove scratch files left behind by the interrupted run
+            for name in os.listdir(output):
+                if name.startswith('scratch') and os.path.isdir(os.path.join(output, name)):
+                    shutil.rmtree(os.path.join(output, name))
+    else:
+        output = sink.path
+        os.makedirs(output)
+
+    origHeight = str(origHeight)
+    origWidth = str(origWidth)
+    origFilename = os.path.join(os.getcwd(), args.inputFile)
+    extension = tileFormats[args.format][0]
+    saveOptions = {}
+    if args.progressive:
+        saveOptions['progressive'] = True
+    if args.optimize:
+        saveOptions['optimize'] = True
+    colorTuple = parseColor(args.backgroundColor)
+
+    # Don't generate preview for partial panoramas
+    if haov < 360 or vaov < 180:
+        genPreview = False
+
+    if args.debug:
+        print('maxLevel: '+ str(levels))
+        print('tileResolution: '+ str(tileSize))
+        print('cubeResolution: '+ str(cubeSize))
+
+    # Record progress, so an interrupted run can be resumed
+    manifestParams = {
+        'tileSize': tileSize,
+        'cubeSize': cubeSize,
+        'quality': args.quality,
+        'extension': extension,
+        'format': args.format,
+        'saveOptions': saveOptions,
+        'targetBytes': args.targetBytes,
+        'targetSSIM': args.targetSSIM,
+        'fallbackSize': args.fallbackSize,
+        'thumbnailSize': args.thumbnailSize,
+        'haov': haov,
+        'horizon': args.horizon,
+        'cylindrical': args.cylindrical,
+        'backgroundColor': colorTuple,
+        'remapper': 'nona' if args.remapper == 'nona' else args.interpolation,
+        'downsampling': args.downsampling,
+        'pruneDetail': args.pruneDetail,
+        'genPreview': genPreview,
+        'archive': args.archive,
+        'dedup': args.dedup,
+    }
+    try:
+        manifest = Manifest(os.path.join(output, 'manifest.jsonl'),
+                            fileHash(args.inputFile), manifestParams, args.resume, args.archive)
+    except ValueError as e:
+        raise GenerateError('Unable to resume: ' + str(e))
+    if args.archive:
+        archive = TileArchive(output, cubeSize, tileSize, levels, manifest)
+
+    if args.remapper == 'nona':
+        # Generate a PTO file for nona for each cube face, so that the faces
+        # can be generated separately, as they're needed
+        projection = "f1" if args.cylindrical else "f4"
+        pitch = 0
+        facestr = 'i a0 b0 c0 d0 e'+ str(args.horizon) +' '+ projection + ' h' + origHeight +' w'+ origWidth +' n"'+ origFilename +'" r0 v' + str(haov)
+        faceAngles = [(0, 0), (0, 180), (-90, 0), (90, 0), (0, 90), (0, -90)]
+        for f, (facePitch, faceYaw) in enumerate(faceAngles):
+            text = []
+            text.append('p E0 R0 f0 h' + str(cubeSize) + ' w' + str(cubeSize) + ' n"TIFF_m" u0 v90')
+            text.append('m g1 i0 m2 p0.00784314')
+            text.append(facestr +' p' + str(pitch + facePitch) +' y' + str(faceYaw))
+            text.append('v')
+            text.append('*')
+            text = '\n'.join(text)
+            with open(os.path.join(output, 'cubic' + str(f) + '.pto'), 'w') as ptoFile:
+                ptoFile.write(text)
+        faces = ['face' + str(f) + '_0000.tif' for f in range(6)]
+    else:
+        # Cube faces are rendered in memory, one at a time, as they're tiled
+        with profile.stage('decode'):
+            if args.maxMemory > 0:
+                # Decode source image once into a scratch file, so it can be paged
+                # in and out as needed while rendering cube face strips
+                budget = args.maxMemory * 2**20
+                scratchDir = tempfile.mkdtemp(prefix='scratch', dir=output)
+                shape = (image.size[1], image.size[0], len(image.mode))
+                decodedSize = 2 * shape[0] * shape[1] * shape[2]  # Decoded and converted copies
+                if decodedSize > budget and not image.decodesInStrips():
+                    print('Warning: ' + str(image.format) + ' input image can only be decoded whole, ' +
+                          'which needs about ' + str(decodedSize // 2**20) + ' MiB, more than the ' +
+                          'memory budget; convert it to PNG or uncompressed TIFF to decode it in strips')
+                step = max(1, budget // (image.size[0] * 16))
+                with open(os.path.join(scratchDir, 'source.raw'), 'wb') as f:
+                    for y, strip in image.strips(step):
+                        strip.tofile(f)
+                source = np.memmap(os.path.join(scratchDir, 'source.raw'), dtype=np.uint8,
+                                   mode='r', shape=shape)
+            else:
+                source = image.array()
+
+    # Directions covered by the panorama
+    bounds = coverageBounds(image.size[0], image.size[1], haov, args.horizon, args.cylindrical)
+
+    def loadFace(f):
+        '''
+        Load cube face f from nona's output or render it, returning None if the
+        panorama doesn't cover the face.
+        '''
+        if args.remapper == 'nona':
+            subprocess.check_call([args.nona, ('-g' if args.gpu else '-d'), '-o',
+                                   os.path.join(output, 'face' + str(f) + '_'),
+                                   os.path.join(output, 'cubic' + str(f) + '.pto')])
+            if os.path.exists(os.path.join(output, faces[f])):
+                face = Image.open(os.path.join(output, faces[f]))
+                face.load()
+                return face
+            return None
+        return remapFace(source, f, cubeSize, haov, args.horizon, args.cylindrical, args.interpolation)
+
+    # Generate tiles (and fallback tiles)
+    print('Generating tiles...')
+    tileParams = {
+        'output': output,
+        'tileSize': tileSize,
+        'extension': extension,
+        'format': args.format,
+        'quality': args.quality,
+        'saveOptions': saveOptions,
+        'targetBytes': args.targetBytes,
+        'targetSSIM': args.targetSSIM,
+        'debug': args.debug,
+        'dedup': args.dedup,
+    }
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+    # Worker processes write tiles straight into an output directory, but
+    # otherwise the encoded tiles are passed back and written to the sink
+    # (deduplicated tiles are compared with the tiles already saved first)
+    tileParams['direct'] = (pool is not None and isinstance(sink, DirectorySink) and not args.archive
+                            and not args.dedup)
+    writer = AsyncSink(sink, args.writers) if args.writers > 0 else sink
+    distinct = manifest.distinctTiles()
+    maxPending = 2 * workers
+    if args.maxMemory > 0:
+        maxPending = max(1, min(maxPending, budget // (16 * cubeSize * tileSize)))
+    pending = collections.deque()
+    sizes = pyramidSizes(cubeSize, levels)
+    fallbackIndex = fallbackLevel(sizes, args.fallbackSize)
+    for level in range(levels, 0, -1):
+        if tileParams['direct'] and not os.path.exists(os.path.join(output, str(level))):
+            os.makedirs(os.path.join(output, str(level)))
+
+    def occupiedTiles(img):
+        '''
+        Determine which tiles of a flattened face level (or strip of one) need
+        to be saved. Tiles that are entirely background are left out, unless
+        an SHT preview is shown behind them, i.e., for full panoramas, of which
+        such tiles are a part.
+        '''
+        if genPreview:
+            rows = int(math.ceil(float(img.size[1]) / tileSize))
+            cols = int(math.ceil(float(img.size[0]) / tileSize))
+            return np.ones((rows, cols), dtype=bool)
+        return ~backgroundTiles(img, tileSize, colorTuple)
+
+    def levelCoverage(f, level, size):
+        '''
+        Determine which tiles of a face level the panorama may cover, from its
+        geometry, so that the others can be left out without looking at their
+        pixels, or None if empty tiles aren't left out. Lower levels allow for
+        pixels that resizing spreads past the covered area, and nona's faces
+        for small differences from the built-in remapper.
+        '''
+        if genPreview:
+            return None
+        margin = (4 if args.remapper == 'nona' else 0) if level == levels else 8
+        return coveredTiles(f, size, tileSize, bounds, margin)
+
+    def skipTileRow(f, level, i, tiles):
+        '''
+        Record row i of tiles of a face level, which the panorama doesn't
+        cover, as missing, unless it was already finished by an earlier run.
+        '''
+        if not manifest.rowDone(f, level, i):
+            manifest.addRow(f, level, i, [(f, level, j, i) for j in range(tiles)], {}, {}, {})
+
+    def writeTiles(savedTiles):
+        '''
+        Write encoded tiles to the sink, returning their sizes.
+        '''
+        for name, data in savedTiles.items():
+            writer.write(name, data)
+        return {name: len(data) for name, data in savedTiles.items()}
+
+    def finishTileRow(f, level, i, missingTiles, savedTiles, hashes, timings):
+        profile.add(timings[1], timings[0], pool is None)
+        aliases = {}
+        for name in list(hashes):
+            # Tiles identical to one that was already saved use its file
+            if hashes[name] in distinct:
+                aliases[name] = distinct[hashes[name]]
+                del savedTiles[name], hashes[name]
+            else:
+                distinct[hashes[name]] = name
+        if args.archive:
+            with profile.stage('write'):
+                savedTiles = archive.add(level, savedTiles)
+        elif not tileParams['direct']:
+            with profile.stage('write'):
+                savedTiles = writeTiles(savedTiles)
+        manifest.addRow(f, level, i, missingTiles, savedTiles, aliases, hashes)
+
+    def waitTileRow():
+        key, future = pending.popleft()
+        with profile.stage('wait'):
+            result = future.result()
+        finishTileRow(*(key + result))
+
+    def queueTileRow(strip, f, level, i, occupied):
+        '''
+        Encode row i of tiles of a face level, possibly in a worker process,
+        unless it was already finished by an earlier run.
+        '''
+        if manifest.rowDone(f, level, i):
+            return
+        occupied = occupied.tolist()
+        if pool is None:
+            finishTileRow(f, level, i, *saveTileRow(strip, f, level, i, occupied, tileParams))
+        else:
+            pending.append(((f, level, i), pool.submit(saveTileRow, strip, f, level, i, occupied, tileParams)))
+            # Limit number of strips held in memory
+            while len(pending) > maxPending:
+                waitTileRow()
+
+    def saveFallback(f, fallback):
+        name = 'fallback/' + faceLetters[f] + extension
+        data = encodeTile(fallback, tileParams)
+        writer.write(name, data)
+        manifest.addFallback(name, len(data))
+
+    def faceDone(f):
+        '''
+        Check if an earlier run already finished cube face f.
+        '''
+        if f in manifest.missingFaces:
+            return True
+        if args.fallbackSize > 0 and not manifest.fallbackDone('fallback/' + faceLetters[f] + extension):
+            return False
+        for level, size in zip(range(levels, 0, -1), sizes):
+            for i in range(0, int(math.ceil(float(size) / tileSize))):
+                if not manifest.rowDone(f, level, i):
+                    return False
+        return True
+
+    def streamFace(f):
+        '''
+        Render and tile cube face f one strip at a time, building the lower
+        levels and the fallback tile incrementally from the rows rendered so
+        far. Returns False if the panorama doesn't cover the face.
+        '''
+        coverage = faceCoverage(f, cubeSize, source.shape[1], source.shape[0],
+                                haov, args.horizon, args.cylindrical)
+        if coverage is None:
+            return False
+        channels = 3 if coverage and source.shape[2] == 3 else 4
+
+        def scratch(level, size):
+            # Only levels that are large compared to the budget are kept on disk
+            if size * size * channels > budget // 4:
+                return os.path.join(scratchDir, faceLetters[f] + str(level) + '.raw')
+            return None
+
+        def tiler(level, size):
+            tiled = 0
+            covered = levelCoverage(f, level, size)
+            def callback(streamingLevel):
+                # Queue each row of tiles as soon as all of its rows are available
+                nonlocal tiled
+                while tiled < streamingLevel.size and (streamingLevel.done == streamingLevel.size
+                                                       or streamingLevel.done >= tiled + tileSize):
+                    end = min(tiled + tileSize, streamingLevel.size)
+                    if covered is not None and not covered[tiled // tileSize].any():
+                        skipTileRow(f, level, tiled // tileSize, len(covered))
+                        tiled = end
+                        continue
+                    with profile.stage('crop'):
+                        strip = Image.fromarray(np.array(streamingLevel.rows[tiled:end]), streamingLevel.mode)
+                    with profile.stage('flatten'):
+                        strip = flattenAlpha(strip, colorTuple)
+                        occupied = occupiedTiles(strip)[0]
+                        if covered is not None:
+                            occupied &= covered[tiled // tileSize]
+                    queueTileRow(strip, f, level, tiled // tileSize, occupied)
+                    tiled = end
+            return callback
+
+        filter = BOX if args.downsampling == 'box' else ANTIALIAS
+        pyramid = [StreamingLevel(cubeSize, channels, scratch(levels, cubeSize), callback=tiler(levels, cubeSize))]
+        for level, size in zip(range(levels - 1, 0, -1), sizes[1:]):
+            pyramid.append(StreamingLevel(size, channels, scratch(level, size), callback=tiler(level, size),
+                                          filter=filter))
+            pyramid[-2].children.append(pyramid[-1])
+        top = pyramid[0]
+        blockSize = coverageBlockSize(cubeSize)
+        covered = coveredTiles(f, cubeSize, blockSize, bounds)
+        stripRows = max(1, budget // (256 * cubeSize))  # Rough remapping working memory
+        for rowStart in range(0, cubeSize, stripRows):
+            rowEnd = min(rowStart + stripRows, cubeSize)
+            with profile.stage('reproject'):
+                # Only the part of the strip the panorama covers is rendered
+                cols = coveredColumns(covered, blockSize, cubeSize, rowStart, rowEnd)
+                if cols is None:
+                    rows = np.zeros((rowEnd - rowStart, cubeSize, 4), dtype=np.uint8)
+                else:
+                    rows = remapRows(source, f, cubeSize, rowStart, rowEnd, haov, args.horizon,
+                                     args.cylindrical, args.interpolation, *cols)
+            # Lower levels are resized from these rows, and their rows of
+            # tiles are queued, as they become available
+            with profile.stage('resize'):
+                top.append(rows[..., :channels])
+        if args.fallbackSize > 0:
+            # Resized from the whole level, which is small, once it's finished
+            with profile.stage('fallback'):
+                level = pyramid[fallbackIndex]
+                fallback = flattenAlpha(Image.fromarray(np.asarray(level.rows), level.mode), colorTuple)
+                saveFallback(f, fallback.resize([args.fallbackSize, args.fallbackSize], ANTIALIAS))
+        for name in os.listdir(scratchDir):
+            if name.startswith(faceLetters[f]):
+                os.remove(os.path.join(scratchDir, name))
+        return True
+
+    def renderFace(f):
+        '''
+        Load or render cube face f in a background thread, returning it along
+        with when reprojecting started and ended.
+        '''
+        start = time.perf_counter()
+        face = loadFace(f)
+        return face, start, time.perf_counter()
+
+    def processFace(f, face):
+        '''
+        Tile cube face f, which is None if the panorama doesn't cover it.
+        '''
+        if face is None:
+            manifest.addMissingFace(f)
+            return
+        # Each level is made from the one above it, and the fallback tile
+        # from the smallest level that's at least as large
+        parent = None
+        for index, (level, size) in enumerate(zip(range(levels, 0, -1), sizes)):
+            with profile.batch('level', face=faceLetters[f], level=level):
+                tiles = int(math.ceil(float(size) / tileSize))
+                if (level < levels):
+                    with profile.stage('resize'):
+                        face = parent if parent is not None else downsample(face, size, args.downsampling)
+                        parent = None
+                covered = levelCoverage(f, level, size)
+                prune = args.pruneDetail > 0 and level == levels and levels > 1
+                flatFace = None
+                if prune or (args.fallbackSize > 0 and index == fallbackIndex):
+                    # Flatten once for the whole level when it's needed whole
+                    with profile.stage('flatten'):
+                        flatFace = flattenAlpha(face, colorTuple)
+                if prune:
+                    # Leave out tiles that don't add detail over the next level
+                    with profile.stage('resize'):
+                        parent = downsample(face, sizes[1], args.downsampling)
+                    with profile.stage('prune'):
+                        detailed = detailedTiles(flatFace, flattenAlpha(parent, colorTuple),
+                                                 tileSize, args.pruneDetail)
+                if args.fallbackSize > 0 and index == fallbackIndex:
+                    with profile.stage('fallback'):
+                        fallback = flatFace.resize([args.fallbackSize, args.fallbackSize], ANTIALIAS)
+                        saveFallback(f, fallback)
+                for i in range(0, tiles):
+                    # Rows of tiles the panorama doesn't cover are left out
+                    # without being cropped or checked for empty tiles
+                    if covered is not None and not covered[i].any():
+                        skipTileRow(f, level, i, tiles)
+                        continue
+                    with profile.stage('crop'):
+                        box = [0, i * tileSize, size, min(i * tileSize + tileSize, size)]
+                        strip = flatFace.crop(box) if flatFace is not None else face.crop(box)
+                    with profile.stage('flatten'):
+                        if flatFace is None:
+                            strip = flattenAlpha(strip, colorTuple)
+                        occupied = occupiedTiles(strip)[0]
+                        if covered is not None:
+                            occupied &= covered[i]
+                    if prune:
+                        occupied &= detailed[i]
+                    queueTileRow(strip, f, level, i, occupied)
+                del flatFace
+
+    todo = [f for f in range(0, 6) if not faceDone(f)]
+    if args.maxMemory > 0:
+        for f in todo:
+            with profile.batch('face', face=faceLetters[f]):
+                if not streamFace(f):
+                    manifest.addMissingFace(f)
+    elif args.maxFaces > 1:
+        # Faces after the one being tiled are reprojected in background
+        # threads, so at most --max-faces faces are held in memory at once;
+        # faces are still tiled in order, which packed archives rely on
+        renders = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(args.maxFaces - 1) as reprojectors:
+            for f in todo[:args.maxFaces - 1]:
+                renders.append(reprojectors.submit(renderFace, f))
+            for index, f in enumerate(todo):
+                with profile.stage('face-wait'):
+                    face, start, end = renders.popleft().result()
+                profile.add([('reproject', start, end)], None, False)
+                if index + args.maxFaces - 1 < len(todo):
+                    renders.append(reprojectors.submit(renderFace, todo[index + args.maxFaces - 1]))
+                with profile.batch('face', face=faceLetters[f]):
+                    processFace(f, face)
+                del face
+    else:
+        for f in todo:
+            with profile.batch('face', face=faceLetters[f]):
+                with profile.stage('reproject'):
+                    face = loadFace(f)
+                processFace(f, face)
+                del face
+    while len(pending) > 0:
+        waitTileRow()
+    if pool is not None:
+        pool.shutdown()
+    if args.archive:
+        archive.close()
+    for level, (tiles, size) in sorted(manifest.levelBytes().items()):
+        print('Level ' + str(level) + ': ' + str(tiles) + ' tiles, ' + str(size) + ' bytes')
+    missingTiles = manifest.missingTiles()
+    allMissingTiles = missingTiles
+    if args.dedup:
+        tileAliases = manifest.tileAliases(cubeSize, tileSize, levels)
+
+    # Tell viewer not to load missing tiles
+    if len(missingTiles) > 0:
+        missingTiles = pruneMissingTiles(missingTiles)
+        missingTilesStr = encodeMissingTiles(missingTiles, cubeSize, tileSize, levels)
+
+    # Clean up temporary files
+    if args.remapper == 'nona' and not args.debug:
+        for f in range(6):
+            for name in ('cubic' + str(f) + '.pto', faces[f]):
+                if os.path.exists(os.path.join(output, name)):
+                    os.remove(os.path.join(output, name))
+    if args.maxMemory > 0:
+        del source
+        shutil.rmtree(scratchDir)
+
+    # Generate preview (but not for partial panoramas)
+    if genPreview:
+        # Generate SHT-hash preview
+        shtHash = manifest.values.get('shtHash')
+        if shtHash is None:
+            with profile.stage('shtHash'):
+                shtHash = img2shtHash(np.asarray(image.preview(1024, 512)))
+            manifest.addValue('shtHash', shtHash)
+    if args.thumbnailSize > 0 and 'equirectangularThumbnail' in manifest.values:
+        equiPreview = manifest.values['equirectangularThumbnail']
+    elif args.thumbnailSize > 0:
+        # Create low-resolution base64-encoded equirectangular preview image
+        with profile.stage('thumbnail'):
+            img = image.preview(args.thumbnailSize, args.thumbnailSize // 2)
+            buf = io.BytesIO()
+            img.save(buf, format='JPEG', quality=75, optimize=True)
+            equiPreview = bytes('data:image/jpeg;base64,', encoding='utf-8')
+            equiPreview += base64.b64encode(buf.getvalue())
+            equiPreview = equiPreview.decode()
+        manifest.addValue('equirectangularThumbnail', equiPreview)
+    manifest.close()
+
+    # Generate config file
+    multiRes = []
+    if genPreview:
+        multiRes.append('"shtHash": "' + shtHash + '"')
+    if args.thumbnailSize > 0:
+        multiRes.append('"equirectangularThumbnail": "' + equiPreview + '"')
+    if len(missingTiles) > 0:
+        multiRes.append('"missingTiles": "' + missingTilesStr + '"')
+    multiRes.append('"path": "/%l/%s%y_%x"')
+    if args.archive:
+        multiRes.append('"archivePath": "/%l"')
+    if args.dedup and tileAliases is not None:
+        multiRes.append('"tileAliases": "' + tileAliases + '"')
+    if args.fallbackSize > 0:
+        multiRes.append('"fallbackPath": "/fallback/%s"')
+    multiRes.append('"extension": "' + extension[1:] + '"')
+    multiRes.append('"tileResolution": ' + str(tileSize))
+    multiRes.append('"maxLevel": ' + str(levels))
+    multiRes.append('"cubeResolution": ' + str(cubeSize))
+    config = configText(args, haov, vaov, colorTuple, multiRes)
+    if args.prefetch is not None:
+        # Tiles of the initial view, chosen as the viewer would from the config
+        with profile.stage('prefetch'):
+            prefetch = prefetchTiles(json.loads(config), args.prefetch[0], args.prefetch[1],
+                                     allMissingTiles)
+        if args.preloadHtml is not None:
+            writer.write('preload.html', preloadHtml(json.loads(config), prefetch,
+                                                     args.preloadHtml).encode('utf-8'))
+        multiRes.append('"prefetch": ' + json.dumps(prefetch, separators=(',', ':')))
+        config = configText(args, haov, vaov, colorTuple, multiRes)
+    writer.write('config.json', config.encode('utf-8'))
+    writer.close()
+    if not isinstance(sink, DirectorySink):
+        shutil.rmtree(output)
+
+    if args.trace:
+        profile.writeTrace(args.trace)
+    if args.profile or args.trace:
+        profile.summary()
+
+imageExtensions = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp')
+
+def batchEntries(path):
+    '''
+    List the panoramas to process in batch mode, from either a directory of
+    images or a JSON file listing them. Each entry of the JSON list is either
+    an image path (relative to the JSON file) or an object with an "input"
+    path, an optional scene "id" and "title", and options that override the
+    command line ones for that panorama, e.g., "haov" or "cylindrical".
+    '''
+    if os.path.isdir(path):
+        entries = [{'input': os.path.join(path, name)} for name in sorted(os.listdir(path))
+                   if name.lower().endswith(imageExtensions)]
+    else:
+        with open(path) as f:
+            entries = [{'input': e} if isinstance(e, str) else dict(e) for e in json.load(f)]
+        for entry in entries:
+            entry['input'] = os.path.join(os.path.dirname(path), entry['input'])
+    sceneIds = set()
+    for entry in entries:
+        if 'id' not in entry:
+            name = os.path.splitext(os.path.basename(entry['input']))[0]
+            entry['id'] = re.sub(r'[^A-Za-z0-9_-]', '_', name)
+        if entry['id'] in sceneIds:
+            raise ValueError('duplicate scene ID "' + entry['id'] + '"')
+        sceneIds.add(entry['id'])
+    return entries
+
+# Options that batch mode sets for every panorama, so entries can't set them
+batchOptions = ('output', 'workers', 'trace', 'resume')
+
+def sceneArgs(parser, args, entry):
+    '''
+    Merge the options of a batch entry into the unchecked command line
+    arguments, parsing them as if they were given on the command line after
+    the others, e.g., "tilesize": 256 as --tilesize=256, and check the result.
+    Options are named by their long option names without the dashes or by
+    their argument names, e.g., "max-memory" or "maxMemory", and flags are
+    set or cleared with true or false. The options in batchOptions aren't
+    allowed.
+    '''
+    actions = {}
+    for action in parser._actions:
+        if action.option_strings and action.dest != 'help':
+            actions[action.dest] = action
+            for option in action.option_strings:
+                if option.startswith('--'):
+                    actions[option[2:]] = action
+    merged = argparse.Namespace(**vars(args))
+    argv = [entry['input']]
+    for key, value in entry.items():
+        if key in ('input', 'id', 'title'):
+            continue
+        if key not in actions:
+            parser.error('unknown option "' + key + '" for "' + entry['input'] + '"')
+        action = actions[key]
+        if action.dest in batchOptions:
+            parser.error('option "' + key + '" for "' + entry['input'] + '" is set by batch mode')
+        option = [o for o in action.option_strings if o.startswith('--')][0]
+        if action.nargs == 0:
+            if not isinstance(value, bool):
+                parser.error('option "' + key + '" for "' + entry['input'] + '" must be true or false')
+            setattr(merged, action.dest, value if action.const else not value)
+        elif value is None or value is False:
+            setattr(merged, action.dest, None)
+        elif value is True and action.nargs == '?':
+            argv.append(option)
+        else:
+            argv.append(option + '=' + (value if isinstance(value, str) else json.dumps(value)))
+    try:
+        return checkArgs(parser, parser.parse_args(argv, merged))
+    except SystemExit:
+        sys.stderr.write('Invalid options for "' + entry['input'] + '"\n')
+        raise
+
+def generateScene(args):
+    '''
+    Process one panorama of a batch, returning its configuration. This runs
+    in worker processes.
+    '''
+    generate(args)
+    with open(os.path.join(args.output, 'config.json')) as f:
+        return json.load(f)
+
+def generateBatch(parser, args):
+    '''
+    Process many panoramas, with each worker process of a shared pool taking
+    the next panorama as soon as it's done with the previous one, and combine
+    their configurations into a tour configuration with one scene each. The
+    options of every panorama are checked, with the parser that parsed the
+    (unchecked) command line arguments, before any of them are processed.
+    Raises GenerateError if the batch can't be processed or if any of its
+    panoramas can't be, in which case the tour configuration still has a
+    scene for each of the others.
+    '''
+    if not isDirectoryOutput(args.output):
+        raise GenerateError('Batch mode requires an output directory')
+    try:
+        entries = batchEntries(args.inputFile)
+    except ValueError as e:
+        raise GenerateError('Invalid batch "' + args.inputFile + '": ' + str(e))
+    if len(entries) == 0:
+        raise GenerateError('No panoramas found in "' + args.inputFile + '"')
+    if os.path.exists(args.output) and not (args.resume or args.debug):
+        raise GenerateError('Output directory "' + args.output + '" already exists')
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    batchArgs = []
+    for entry in entries:
+        entryArgs = argparse.Namespace(**vars(args))
+        entryArgs.output = os.path.join(args.output, entry['id'])
+        entryArgs.workers = 1
+        if args.trace:
+            base, ext = os.path.splitext(args.trace)
+            entryArgs.trace = base + '-' + entry['id'] + ext
+        batchArgs.append(sceneArgs(parser, entryArgs, entry))
+    os.makedirs(args.output, exist_ok=True)
+    scenes = collections.OrderedDict()
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(generateScene, entryArgs) for entryArgs in batchArgs]
+        for entry, future in zip(entries, futures):
+            try:
+                config = future.result()
+            except Exception as e:
+                print('Unable to process "' + entry['input'] + '": ' + str(e))
+                continue
+            config['multiRes']['basePath'] = './' + entry['id']
+            scenes[entry['id']] = collections.OrderedDict([('title', entry.get('title', entry['id']))])
+            scenes[entry['id']].update(config)
+    if len(scenes) == 0:
+        raise GenerateError('Unable to process any of the panoramas')
+
+    # Generate tour config file
+    tour = collections.OrderedDict()
+    tour['default'] = {'firstScene': next(iter(scenes))}
+    tour['scenes'] = scenes
+    with open(os.path.join(args.output, 'config.json'), 'w') as f:
+        json.dump(tour, f, indent=4)
+    if len(scenes) < len(entries):
+        raise GenerateError('Unable to process ' + str(len(entries) - len(scenes)) + ' of ' +
+                            str(len(entries)) + ' panoramas')
+
+def main():
+    parser = argumentParser()
+    args = parser.parse_args()
+    try:
+        if os.path.isdir(args.inputFile) or args.inputFile.lower().endswith('.json'):
+            generateBatch(parser, args)
+        else:
+            generate(checkArgs(parser, args))
+    except GenerateError as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,558 @@
+# multires.py - Multires viewer node selection shared by the Pannellum tools
+# Copyright (c) 2014-2025 Matthew Petroff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Parts of the Pannellum viewer shared by generate.py and simulate.py: the
+base83 encoding of config.json values, and a port of libpannellum.js's
+multires node selection, which chooses the tiles of a view in the order in
+which the viewer requests them.
+'''
+
+import os
+import sys
+import math
+import json
+import collections
+from array import array
+
+b83chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+def b83encode(vals, length):
+    result = ""
+    for val in vals:
+        for i in range(1, length + 1):
+            result += b83chars[int(val // (83 ** (length - i))) % 83]
+    return result
+
+def b83decode(b83str, length):
+    vals = []
+    for i in range(len(b83str) // length):
+        val = 0
+        for c in b83str[i * length:(i + 1) * length]:
+            val = val * 83 + b83chars.index(c)
+        vals.append(val)
+    return vals
+
+# Number of nodes the viewer keeps in its cache, as in libpannellum.js
+nodeCacheSize = 200
+
+# Cube face vertices, as in libpannellum.js
+cubeVertices = [
+    -1,  1, -1,  1,  1, -1,  1, -1, -1, -1, -1, -1,  # Front face
+     1,  1,  1, -1,  1,  1, -1, -1,  1,  1, -1,  1,  # Back face
+    -1,  1,  1,  1,  1,  1,  1,  1, -1, -1,  1, -1,  # Up face
+    -1, -1, -1,  1, -1, -1,  1, -1,  1, -1, -1,  1,  # Down face
+    -1,  1,  1, -1,  1, -1, -1, -1, -1, -1, -1,  1,  # Left face
+     1,  1, -1,  1,  1,  1,  1, -1,  1,  1, -1, -1   # Right face
+]
+
+
+def f32(values):
+    '''
+    Round values to single precision, like storing them in a Float32Array.
+    '''
+    return array('f', values).tolist()
+
+def rotateMatrix(m, angle, axis):
+    s = math.sin(angle)
+    c = math.cos(angle)
+    if axis == 'x':
+        return f32([m[0], c*m[1] + s*m[2], c*m[2] - s*m[1],
+                    m[3], c*m[4] + s*m[5], c*m[5] - s*m[4],
+                    m[6], c*m[7] + s*m[8], c*m[8] - s*m[7]])
+    if axis == 'y':
+        return f32([c*m[0] - s*m[2], m[1], c*m[2] + s*m[0],
+                    c*m[3] - s*m[5], m[4], c*m[5] + s*m[3],
+                    c*m[6] - s*m[8], m[7], c*m[8] + s*m[6]])
+    return f32([c*m[0] + s*m[1], c*m[1] - s*m[0], m[2],
+                c*m[3] + s*m[4], c*m[4] - s*m[3], m[5],
+                c*m[6] + s*m[7], c*m[7] - s*m[6], m[8]])
+
+def makePersp(hfov, width, height, znear, zfar):
+    fovy = 2 * math.atan(math.tan(hfov / 2) * height / width)
+    f = 1 / math.tan(fovy / 2)
+    return f32([f / (width / height), 0, 0, 0,
+                0, f, 0, 0,
+                0, 0, (zfar + znear) / (znear - zfar), (2 * zfar * znear) / (znear - zfar),
+                0, 0, -1, 0])
+
+def rotatePersp(p, r):
+    '''
+    Rotate a perspective matrix by a 3x3 rotation matrix.
+    '''
+    return f32([p[0]*r[0], p[0]*r[1], p[0]*r[2], 0,
+                p[5]*r[3], p[5]*r[4], p[5]*r[5], 0,
+                p[10]*r[6], p[10]*r[7], p[10]*r[8], p[11],
+                -r[6], -r[7], -r[8], 0])
+
+def applyRotPerspToVec(m, v):
+    w = m[12]*v[0] + m[13]*v[1] + m[14]*v[2]
+    return f32([m[0]*v[0] + m[1]*v[1] + m[2]*v[2],
+                m[4]*v[0] + m[5]*v[1] + m[6]*v[2],
+                m[11] + m[8]*v[0] + m[9]*v[1] + m[10]*v[2],
+                1 / w if w != 0 else math.copysign(math.inf, w)])
+
+def checkInView(m, v):
+    vpp = applyRotPerspToVec(m, v)
+    winX = vpp[0] * vpp[3]
+    winY = vpp[1] * vpp[3]
+    winZ = vpp[2] * vpp[3]
+    return (-1 if winX < -1 else 1 if winX > 1 else 0,
+            -1 if winY < -1 else 1 if winY > 1 else 0,
+            1 if winZ < -1 or winZ > 1 else 0)
+
+def checkSquareInView(m, v):
+    checks = [checkInView(m, v[i:i + 3]) for i in (0, 3, 6, 9)]
+    for axis in range(2):
+        test = sum(c[axis] for c in checks)
+        if test == -4 or test == 4:
+            return False
+    return sum(c[2] for c in checks) != 4
+
+def horizonView(pitch, yaw, roll, horizonPitch, horizonRoll):
+    '''
+    Apply the horizon pitch and roll to a view, as the viewer does.
+    '''
+    x = math.cos(horizonRoll) * math.sin(pitch) * math.sin(horizonPitch) + \
+        math.cos(pitch) * (math.cos(horizonPitch) * math.cos(yaw) +
+        math.sin(horizonRoll) * math.sin(horizonPitch) * math.sin(yaw))
+    y = -math.sin(pitch) * math.sin(horizonRoll) + \
+        math.cos(pitch) * math.cos(horizonRoll) * math.sin(yaw)
+    z = math.cos(horizonRoll) * math.cos(horizonPitch) * math.sin(pitch) + \
+        math.cos(pitch) * (-math.cos(yaw) * math.sin(horizonPitch) +
+        math.cos(horizonPitch) * math.sin(horizonRoll) * math.sin(yaw))
+    newPitch = math.asin(max(min(z, 1), -1))
+    newYaw = math.atan2(y, x)
+    v = [math.cos(pitch) * (math.sin(horizonRoll) * math.sin(horizonPitch) * math.cos(yaw) -
+         math.cos(horizonPitch) * math.sin(yaw)),
+         math.cos(pitch) * math.cos(horizonRoll) * math.cos(yaw),
+         math.cos(pitch) * (math.cos(horizonPitch) * math.sin(horizonRoll) * math.cos(yaw) +
+         math.sin(yaw) * math.sin(horizonPitch))]
+    w = [-math.cos(newPitch) * math.sin(newYaw), math.cos(newPitch) * math.cos(newYaw)]
+    rollAdj = math.acos(max(min((v[0]*w[0] + v[1]*w[1]) /
+                                (math.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2]) *
+                                 math.sqrt(w[0]*w[0] + w[1]*w[1])), 1), -1))
+    if v[2] < 0:
+        rollAdj = 2 * math.pi - rollAdj
+    return newPitch, newYaw, roll + rollAdj
+
+
+class TileSet(object):
+    '''
+    Multires scene of a config.json, given by its path or its parsed
+    contents, along with the sizes of its tiles, which are read from the tile
+    set's directory.
+    '''
+    def __init__(self, configPath, tilesDir=None, sceneId=None):
+        if isinstance(configPath, dict):
+            config = configPath
+            configPath = ''
+            self.configBytes = None
+        else:
+            with open(configPath) as f:
+                config = json.load(f)
+            self.configBytes = os.path.getsize(configPath)
+        if 'scenes' in config:
+            scene = dict(config.get('default', {}))
+            if sceneId is None:
+                sceneId = scene.get('firstScene', next(iter(config['scenes'])))
+            scene.update(config['scenes'][sceneId])
+        else:
+            scene = config
+        if scene.get('type') != 'multires':
+            raise ValueError('scene isn\'t a multires scene')
+        multiRes = scene['multiRes']
+        self.scene = scene
+        self.tilesDir = tilesDir if tilesDir is not None else os.path.dirname(os.path.abspath(configPath))
+        self.path = multiRes['path']
+        self.extension = '.' + multiRes['extension'] if multiRes.get('extension') else ''
+        self.tileResolution = multiRes['tileResolution']
+        self.maxLevel = multiRes['maxLevel']
+        self.cubeResolution = multiRes['cubeResolution']
+        self.missing = self.parseMissingTiles(multiRes.get('missingTiles'))
+        self.archivePath = multiRes.get('archivePath')
+        self.indexes = {}
+
+        # Table of deduplicated tiles
+        self.aliases = None
+        if 'tileAliases' in multiRes:
+            digits = b83decode(multiRes['tileAliases'][0], 1)[0]
+            pairs = b83decode(multiRes['tileAliases'][1:], digits)
+            self.aliases = dict(zip(pairs[0::2], pairs[1::2]))
+            self.aliasOffsets = {}
+            self.aliasTiles = {}
+            offset = 0
+            for level in range(1, self.maxLevel + 1):
+                tiles = math.ceil(math.floor(self.cubeResolution / 2**(self.maxLevel - level)) / self.tileResolution)
+                self.aliasOffsets[level] = offset
+                self.aliasTiles[level] = tiles
+                offset += 6 * tiles * tiles
+
+    def parseMissingTiles(self, missingTiles):
+        '''
+        Parse the list of missing tiles in the same way as the viewer.
+        '''
+        missing = set()
+        if not missingTiles:
+            return missing
+        level = -1
+        perSide = missingTiles.split('!')
+        for i in range(1, len(perSide)):
+            side = perSide[i][0]
+            hasLevels = '>' in perSide[i]
+            perLevel = perSide[i].split('>') if hasLevels else [side, perSide[i][1:]]
+            for j in range(1, len(perLevel)):
+                if hasLevels:
+                    level = b83decode(perLevel[j][0], 1)[0]
+                maxTileNum = math.ceil(self.cubeResolution / 2**(self.maxLevel - level) / self.tileResolution) - 1
+                numTileDigits = math.ceil(math.log(maxTileNum + 1) / math.log(83))
+                tiles = b83decode(perLevel[j][1:], numTileDigits) if len(perLevel[j]) > 1 else [0, 0]
+                for k in range(len(tiles) // 2):
+                    missing.add((side, level, tiles[k * 2], tiles[k * 2 + 1]))
+        return missing
+
+    def nodePath(self, side, level, x, y):
+        return self.path.replace('%s', side, 1).replace('%l0', str(level - 1), 1) \
+            .replace('%l', str(level), 1).replace('%x', str(x), 1).replace('%y', str(y), 1)
+
+    def fileSize(self, path):
+        '''
+        Get the size of a file of the tile set, or None if it doesn't exist.
+        '''
+        try:
+            return os.path.getsize(os.path.join(self.tilesDir, path.lstrip('/')))
+        except OSError:
+            return None
+
+    def index(self, level):
+        '''
+        Read the index of a packed tile archive, returning the number of tiles
+        along each side of a face and the offset of each tile.
+        '''
+        if level not in self.indexes:
+            path = self.archivePath.replace('%l', str(level), 1)
+            with open(os.path.join(self.tilesDir, path.lstrip('/') + '.idx'), 'rb') as f:
+                data = array('I', f.read())
+            if sys.byteorder != 'little':
+                data.byteswap()
+            offsets = [0]
+            for length in data[1:]:
+                offsets.append(offsets[-1] + length)
+            self.indexes[level] = (path, data[0], offsets)
+        return self.indexes[level]
+
+    def url(self, node):
+        '''
+        Get the URL of a node's tile, when it isn't in a packed tile archive.
+        '''
+        path = node.path
+        if self.aliases is not None:
+            tiles = self.aliasTiles[node.level]
+            shared = self.aliases.get(self.aliasOffsets[node.level] +
+                                      ('fbudlr'.index(node.side) * tiles + node.y) * tiles + node.x)
+            if shared is not None:
+                # Deduplicated tiles use the file of an identical tile, on any level
+                level = max(l for l in self.aliasOffsets if self.aliasOffsets[l] <= shared)
+                tiles = self.aliasTiles[level]
+                shared -= self.aliasOffsets[level]
+                path = self.nodePath('fbudlr'[shared // (tiles * tiles)], level,
+                                     shared % tiles, shared // tiles % tiles)
+        return path + self.extension
+
+    def source(self, node):
+        '''
+        Get the URL and size of a node's tile, with a size of None if the file
+        doesn't exist, or None if there's no tile in a packed tile archive.
+        '''
+        if self.archivePath is not None:
+            path, tiles, offsets = self.index(node.level)
+            i = ('fbudlr'.index(node.side) * tiles + node.y) * tiles + node.x
+            if offsets[i + 1] <= offsets[i]:
+                return None  # Missing tile
+            return (path + '.pack#bytes=' + str(offsets[i]) + '-' + str(offsets[i + 1] - 1),
+                    offsets[i + 1] - offsets[i])
+        url = self.url(node)
+        return url, self.fileSize(url)
+
+
+class Node(object):
+    '''
+    Multires node, i.e., a tile of a face level, as in libpannellum.js.
+    '''
+    def __init__(self, tileSet, vertices, side, level, x, y, parentPath):
+        self.vertices = vertices
+        self.side = side
+        self.level = level
+        self.x = x
+        self.y = y
+        self.path = tileSet.nodePath(side, level, x, y)
+        self.parentPath = parentPath
+        self.texture = False
+        self.textureLoad = False
+        self.timestamp = 0
+        self.diff = 0
+
+
+class Viewer(object):
+    '''
+    Port of the WebGL multires renderer of libpannellum.js, which chooses the
+    visible nodes for a view and requests their tiles, one per frame.
+    '''
+    def __init__(self, tileSet, width, height):
+        self.tileSet = tileSet
+        self.width = width
+        self.height = height
+        self.nodeCache = []
+        self.nodeCacheTimestamp = 0
+        self.currentNodes = []
+        self.textureLoads = collections.deque()
+        self.loading = {}  # Nodes waiting for each URL, shared by identical tiles
+        self.evicted = 0
+        self.pose = None
+        horizonPitch = math.radians(tileSet.scene.get('horizonPitch', 0))
+        horizonRoll = math.radians(tileSet.scene.get('horizonRoll', 0))
+        if horizonPitch != 0 or horizonRoll != 0:
+            self.pose = (horizonPitch, horizonRoll)
+
+    def render(self, pitch, yaw, hfov, roll=0):
+        '''
+        Choose the nodes for a view (in radians), returning the node whose
+        tile is requested in this frame, if any.
+        '''
+        if self.pose is not None:
+            pitch, yaw, roll = horizonView(pitch, yaw, roll, *self.pose)
+        perspMatrix = makePersp(hfov, self.width, self.height, 0.1, 100.0)
+        perspMatrixNoClip = makePersp(hfov, self.width, self.height, -100.0, 100.0)
+        matrix = f32([1, 0, 0, 0, 1, 0, 0, 0, 1])
+        matrix = rotateMatrix(matrix, -roll, 'z')
+        matrix = rotateMatrix(matrix, -pitch, 'x')
+        matrix = rotateMatrix(matrix, yaw, 'y')
+        rotPersp = rotatePersp(perspMatrix, matrix)
+        rotPerspNoClip = rotatePersp(perspMatrixNoClip, matrix)
+
+        # Base tiles first, then most recently used first
+        self.nodeCache.sort(key=lambda n: (n.level != 1, -n.timestamp))
+        if len(self.nodeCache) > nodeCacheSize and len(self.nodeCache) > len(self.currentNodes) + 50:
+            self.evicted += len(self.nodeCache) - nodeCacheSize
+            del self.nodeCache[nodeCacheSize:]
+        self.currentNodes = []
+        for s, side in enumerate('fbudlr'):
+            node = Node(self.tileSet, f32(cubeVertices[s * 12:s * 12 + 12]), side, 1, 0, 0, None)
+            self.testNode(rotPersp, rotPerspNoClip, node, pitch, yaw)
+        self.currentNodes.sort(key=lambda n: (n.level, n.diff))
+
+        request = None
+        for node in self.currentNodes:
+            if not node.texture and not node.textureLoad:
+                node.textureLoad = True
+                request = node
+                break
+
+        # Process one loaded tile
+        if self.textureLoads:
+            url, success = self.textureLoads.popleft()
+            for node in self.loading.pop(url, []):
+                node.texture = success
+        return request
+
+    def testNode(self, rotPersp, rotPerspNoClip, node, pitch, yaw):
+        '''
+        Add a node to the current nodes if it's visible and its tile is
+        needed, and test its children.
+        '''
+        tileSet = self.tileSet
+        tileResolution = tileSet.tileResolution
+        if (node.side, node.level, node.x, node.y) in tileSet.missing:
+            return
+        if not checkSquareInView(rotPersp, node.vertices):
+            return
+        cornersWinX = []
+        cornersWinY = []
+        minCornersWinZ = 2
+        cornersInView = []
+        for i in range(4):
+            corner = applyRotPerspToVec(rotPerspNoClip, node.vertices[i * 3:(i + 1) * 3])
+            cornersWinX.append(corner[0] * corner[3])
+            cornersWinY.append(corner[1] * corner[3])
+            cornerWinZ = corner[2] * corner[3]
+            minCornersWinZ = min(minCornersWinZ, cornerWinZ)
+            cornersInView.append(abs(cornersWinX[i]) <= 1 and abs(cornersWinY[i]) <= 1 and cornerWinZ > 0)
+        numCornersInView = sum(cornersInView)
+
+        cubeSize = tileSet.cubeResolution * 2**(node.level - tileSet.maxLevel)
+        numTiles = math.ceil(cubeSize / tileResolution) - 1
+        doubleTileSize = cubeSize % tileResolution * 2
+        lastTileSize = (cubeSize * 2) % tileResolution
+        if lastTileSize == 0:
+            lastTileSize = tileResolution
+        if doubleTileSize == 0:
+            doubleTileSize = tileResolution * 2
+
+        if node.level > 1 and minCornersWinZ > 0 and numCornersInView > 0:
+            # Length of node sides that are at least partly in view
+            maxSide = 0
+            for i in range(4):
+                j = (i + 1) % 4
+                if cornersInView[i] or cornersInView[j]:
+                    diffX = (cornersWinX[j] - cornersWinX[i]) * self.width / 2
+                    diffY = (cornersWinY[j] - cornersWinY[i]) * self.height / 2
+                    if lastTileSize < tileResolution:
+                        if node.x == numTiles:
+                            diffX *= tileResolution / lastTileSize
+                        elif node.y == numTiles:
+                            diffY *= tileResolution / lastTileSize
+                    if doubleTileSize <= tileResolution:
+                        if node.x == numTiles:
+                            diffX *= 2
+                        if node.y == numTiles:
+                            diffY *= 2
+                    maxSide = max(maxSide, math.sqrt(diffX * diffX + diffY * diffY))
+            if maxSide <= tileResolution / 2:
+                return
+
+        # Central angle between center of view and center of tile
+        v = node.vertices
+        x = v[0] + v[3] + v[6] + v[9]
+        y = v[1] + v[4] + v[7] + v[10]
+        z = v[2] + v[5] + v[8] + v[11]
+        r = math.sqrt(x*x + y*y + z*z)
+        theta = math.asin(z / r)
+        phi = math.atan2(y, x)
+        ydiff = phi - yaw
+        ydiff += -2 * math.pi if ydiff > math.pi else 2 * math.pi if ydiff < -math.pi else 0
+        ydiff = abs(ydiff)
+        node.diff = math.acos(max(min(math.sin(pitch) * math.sin(theta) +
+                                      math.cos(pitch) * math.cos(theta) * math.cos(ydiff), 1), -1))
+
+        for cached in self.nodeCache:
+            if cached.path == node.path:
+                cached.timestamp = self.nodeCacheTimestamp
+                self.nodeCacheTimestamp += 1
+                cached.diff = node.diff
+                self.currentNodes.append(cached)
+                break
+        else:
+            node.timestamp = self.nodeCacheTimestamp
+            self.nodeCacheTimestamp += 1
+            self.currentNodes.append(node)
+            self.nodeCache.append(node)
+
+        if node.level >= tileSet.maxLevel:
+            return
+
+        # Create child nodes
+        f = 0.5
+        if node.x == numTiles or node.y == numTiles:
+            f = 1.0 - tileResolution / (tileResolution + lastTileSize)
+        i = 1.0 - f
+        f1 = f2 = f3 = f
+        i1 = i2 = i3 = i
+        if lastTileSize < tileResolution:
+            if node.x == numTiles and node.y != numTiles:
+                f2 = i2 = 0.5
+                if node.side == 'd' or node.side == 'u':
+                    f3 = i3 = 0.5
+            elif node.x != numTiles and node.y == numTiles:
+                f1 = i1 = 0.5
+                if node.side == 'l' or node.side == 'r':
+                    f3 = i3 = 0.5
+        lastColumn = node.x == numTiles and doubleTileSize <= tileResolution
+        lastRow = node.y == numTiles and doubleTileSize <= tileResolution
+        if doubleTileSize <= tileResolution:
+            if node.x == numTiles:
+                f1, i1 = 0, 1
+                if node.side == 'l' or node.side == 'r':
+                    f3, i3 = 0, 1
+            if node.y == numTiles:
+                f2, i2 = 0, 1
+                if node.side == 'd' or node.side == 'u':
+                    f3, i3 = 0, 1
+
+        children = [(node.x * 2, node.y * 2, [
+            v[0], v[1], v[2],
+            v[0]*f1 + v[3]*i1, v[1]*f + v[4]*i, v[2]*f3 + v[5]*i3,
+            v[0]*f1 + v[6]*i1, v[1]*f2 + v[7]*i2, v[2]*f3 + v[8]*i3,
+            v[0]*f + v[9]*i, v[1]*f2 + v[10]*i2, v[2]*f3 + v[11]*i3])]
+        if not lastColumn:
+            children.append((node.x * 2 + 1, node.y * 2, [
+                v[0]*f1 + v[3]*i1, v[1]*f + v[4]*i, v[2]*f3 + v[5]*i3,
+                v[3], v[4], v[5],
+                v[3]*f + v[6]*i, v[4]*f2 + v[7]*i2, v[5]*f3 + v[8]*i3,
+                v[0]*f1 + v[6]*i1, v[1]*f2 + v[7]*i2, v[2]*f3 + v[8]*i3]))
+        if not lastColumn and not lastRow:
+            children.append((node.x * 2 + 1, node.y * 2 + 1, [
+                v[0]*f1 + v[6]*i1, v[1]*f2 + v[7]*i2, v[2]*f3 + v[8]*i3,
+                v[3]*f + v[6]*i, v[4]*f2 + v[7]*i2, v[5]*f3 + v[8]*i3,
+                v[6], v[7], v[8],
+                v[9]*f1 + v[6]*i1, v[10]*f + v[7]*i, v[11]*f3 + v[8]*i3]))
+        if not lastRow:
+            children.append((node.x * 2, node.y * 2 + 1, [
+                v[0]*f + v[9]*i, v[1]*f2 + v[10]*i2, v[2]*f3 + v[11]*i3,
+                v[0]*f1 + v[6]*i1, v[1]*f2 + v[7]*i2, v[2]*f3 + v[8]*i3,
+                v[9]*f1 + v[6]*i1, v[10]*f + v[7]*i, v[11]*f3 + v[8]*i3,
+                v[9], v[10], v[11]]))
+        for cx, cy, vertices in children:
+            child = Node(tileSet, f32(vertices), node.side, node.level + 1, cx, cy, node.path)
+            self.testNode(rotPersp, rotPerspNoClip, child, pitch, yaw)
+
+
+class CameraPath(object):
+    '''
+    Camera path given by keyframes, each with a time in seconds and a pitch,
+    yaw, horizontal field of view, and roll in degrees, which are linearly
+    interpolated. Missing values are taken from the previous keyframe, or from
+    the scene's initial view for the first keyframe.
+    '''
+    def __init__(self, keyframes, scene):
+        view = {'pitch': scene.get('pitch', 0), 'yaw': scene.get('yaw', 0),
+                'hfov': scene.get('hfov', 100), 'roll': scene.get('roll', 0)}
+        self.keyframes = []
+        for keyframe in sorted(keyframes, key=lambda k: k.get('time', 0)):
+            view = dict(view)
+            view.update((k, keyframe[k]) for k in view if k in keyframe)
+            self.keyframes.append((keyframe.get('time', 0), view))
+        if not self.keyframes:
+            self.keyframes.append((0, view))
+        self.duration = self.keyframes[-1][0]
+
+    def view(self, t):
+        '''
+        Get the pitch, yaw, horizontal field of view, and roll at a time, in
+        radians.
+        '''
+        view = self.keyframes[-1][1]
+        prevTime, prevView = self.keyframes[0]
+        for time, nextView in self.keyframes:
+            if t <= time:
+                a = (t - prevTime) / (time - prevTime) if time > prevTime else 1
+                view = {k: prevView[k] + (nextView[k] - prevView[k]) * a for k in nextView}
+                break
+            prevTime, prevView = time, nextView
+        return tuple(math.radians(view[k]) for k in ('pitch', 'yaw', 'hfov', 'roll'))
+
+
+def initialViewNodes(tileSet, width, height):
+    '''
+    Choose the nodes of a scene's initial view, in the order in which the
+    viewer requests their tiles.
+    '''
+    viewer = Viewer(tileSet, width, height)
+    viewer.render(*CameraPath([], tileSet.scene).view(0))
+    return viewer.currentNodes
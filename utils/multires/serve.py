@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+# serve.py - On-demand multires tile server for Pannellum
+# Copyright (c) 2014-2025 Matthew Petroff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import re
+import math
+import base64
+import io
+import collections
+import threading
+import concurrent.futures
+import urllib.parse
+import http.server
+import numpy as np
+from PIL import Image
+
+import generate
+
+tilePattern = re.compile(r'^/(\d+)/([fbudlr])(\d+)_(\d+)(\.\w+)$')
+fallbackPattern = re.compile(r'^/fallback/([fbudlr])(\.\w+)$')
+
+
+class LRUCache(object):
+    '''
+    Thread-safe cache that evicts the least recently used entries once the
+    total size of its entries exceeds maxBytes.
+    '''
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.maxBytes and len(self.entries) > 1:
+                self.size -= self.entries.popitem(last=False)[1][1]
+
+
+class TileRenderer(object):
+    '''
+    Render the tiles, fallback tiles, and config.json of a multires tile set
+    from a panorama as they're requested. Each row of tiles of a face level is
+    rendered directly at the level's resolution from a reduced-resolution
+    copy of the panorama that's at least as detailed, instead of from the
+    levels above it. Rendered rows of tiles and encoded tiles are kept in LRU
+    caches, and concurrent requests for the same tile are only rendered once.
+    '''
+    def __init__(self, args, regionCacheBytes, tileCacheBytes):
+        self.args = args
+        self.image = generate.ImageSource(args.inputFile, (max(1024, args.thumbnailSize),
+                                                           max(512, args.thumbnailSize // 2)))
+        self.haov, self.vaov, self.cubeSize, self.tileSize, self.levels = \
+            generate.tileSetLayout(args, *self.image.size)
+        self.sizes = generate.pyramidSizes(self.cubeSize, self.levels)[::-1]  # By level, from 1
+        self.colorTuple = generate.parseColor(args.backgroundColor)
+        self.extension = generate.tileFormats[args.format][0]
+        saveOptions = {}
+        if args.progressive:
+            saveOptions['progressive'] = True
+        if args.optimize:
+            saveOptions['optimize'] = True
+        self.tileParams = {
+            'format': args.format,
+            'quality': args.quality,
+            'saveOptions': saveOptions,
+            'targetBytes': args.targetBytes,
+            'targetSSIM': args.targetSSIM,
+        }
+        self.sources = {}
+        self.regions = LRUCache(regionCacheBytes)
+        self.tiles = LRUCache(tileCacheBytes)
+        self.rendering = {}
+        self.lock = threading.Lock()
+
+    def coalesce(self, key, render):
+        '''
+        Call render() for a key, unless it's already being called for the same
+        key by another thread, in which case wait for its result instead.
+        '''
+        with self.lock:
+            future = self.rendering.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self.rendering[key] = future
+        if not owner:
+            return future.result()
+        try:
+            result = render()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.rendering[key]
+
+    def cached(self, cache, key, render, size):
+        value = cache.get(key)
+        if value is None:
+            def renderAndCache():
+                value = render()
+                cache.put(key, value, size(value))
+                return value
+            value = self.coalesce(key, renderAndCache)
+        return value
+
+    def source(self, size):
+        '''
+        Get the smallest reduced-resolution copy of the panorama, made by
+        halving it repeatedly, that's still at least as detailed as a cube face
+        of the given size, along with the horizon offset scaled to match.
+        '''
+        width = self.image.size[0]
+        needed = size * math.pi * self.haov / 360  # Width that matches the face
+        k = int(math.floor(math.log(width / needed, 2))) if width > needed else 0
+        def render():
+            if k == 0:
+                return self.image.array()
+            img = Image.fromarray(self.source(2 * size)[0])
+            return np.asarray(img.resize([img.size[0] // 2, img.size[1] // 2], generate.ANTIALIAS))
+        with self.lock:
+            src = self.sources.get(k)
+        if src is None:
+            src = self.coalesce(('source', k), render)
+            with self.lock:
+                self.sources[k] = src
+        return src, self.args.horizon * src.shape[0] / self.image.size[1]
+
+    def render(self, f, size, rowStart, rowEnd):
+        src, horizon = self.source(size)
+        rows = generate.remapRows(src, f, size, rowStart, rowEnd, self.haov, horizon,
+                                  self.args.cylindrical, self.args.interpolation)
+        return generate.flattenAlpha(Image.fromarray(rows, 'RGBA'), self.colorTuple)
+
+    def region(self, level, f, i):
+        '''
+        Render row i of tiles of a face level, with any alpha channel flattened.
+        '''
+        size = self.sizes[level - 1]
+        rowStart = i * self.tileSize
+        rowEnd = min(rowStart + self.tileSize, size)
+        return self.cached(self.regions, ('region', level, f, i),
+                           lambda: self.render(f, size, rowStart, rowEnd),
+                           lambda img: img.size[0] * img.size[1] * 3)
+
+    def tile(self, level, f, i, j):
+        '''
+        Get an encoded tile, or None if there's no such tile.
+        '''
+        if level < 1 or level > self.levels:
+            return None
+        size = self.sizes[level - 1]
+        tiles = int(math.ceil(float(size) / self.tileSize))
+        if i >= tiles or j >= tiles:
+            return None
+        def render():
+            strip = self.region(level, f, i)
+            tile = strip.crop([j * self.tileSize, 0, min(j * self.tileSize + self.tileSize, size), strip.size[1]])
+            return generate.encodeTileSearch(tile, self.tileParams)
+        return self.cached(self.tiles, ('tile', level, f, i, j), render, len)
+
+    def fallback(self, f):
+        if self.args.fallbackSize <= 0:
+            return None
+        size = self.args.fallbackSize
+        return self.cached(self.tiles, ('fallback', f),
+                           lambda: generate.encodeTile(self.render(f, size, 0, size), self.tileParams), len)
+
+    def config(self):
+        '''
+        Format config.json, with an SHT hash preview for full panoramas and a
+        thumbnail if requested. Since tiles are only rendered on demand, the
+        missing tiles of partial panoramas aren't known, so they're served as
+        background-colored tiles instead.
+        '''
+        def render():
+            args = self.args
+            multiRes = []
+            if self.haov >= 360 and self.vaov >= 180:
+                shtHash = generate.img2shtHash(np.asarray(self.image.preview(1024, 512)))
+                multiRes.append('"shtHash": "' + shtHash + '"')
+            if args.thumbnailSize > 0:
+                img = self.image.preview(args.thumbnailSize, args.thumbnailSize // 2)
+                buf = io.BytesIO()
+                img.save(buf, format='JPEG', quality=75, optimize=True)
+                equiPreview = 'data:image/jpeg;base64,' + base64.b64encode(buf.getvalue()).decode()
+                multiRes.append('"equirectangularThumbnail": "' + equiPreview + '"')
+            multiRes.append('"path": "/%l/%s%y_%x"')
+            if args.fallbackSize > 0:
+                multiRes.append('"fallbackPath": "/fallback/%s"')
+            multiRes.append('"extension": "' + self.extension[1:] + '"')
+            multiRes.append('"tileResolution": ' + str(self.tileSize))
+            multiRes.append('"maxLevel": ' + str(self.levels))
+            multiRes.append('"cubeResolution": ' + str(self.cubeSize))
+            text = generate.configText(args, self.haov, self.vaov, self.colorTuple, multiRes)
+            return text.encode('utf-8')
+        return self.cached(self.tiles, ('config',), render, len)
+
+    def get(self, path):
+        '''
+        Get the contents and content type of a file of the tile set, or None if
+        there's no such file.
+        '''
+        if path == '/config.json':
+            return self.config(), 'application/json'
+        contentType = 'image/' + generate.tileFormats[self.args.format][1].lower()
+        match = tilePattern.match(path)
+        if match and match.group(5) == self.extension:
+            f = generate.faceLetters.index(match.group(2))
+            data = self.tile(int(match.group(1)), f, int(match.group(3)), int(match.group(4)))
+            return (data, contentType) if data is not None else None
+        match = fallbackPattern.match(path)
+        if match and match.group(2) == self.extension:
+            data = self.fallback(generate.faceLetters.index(match.group(1)))
+            return (data, contentType) if data is not None else None
+        return None
+
+
+class TileRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        result = self.server.renderer.get(path)
+        if result is None:
+            self.send_error(404)
+            return
+        data, contentType = result
+        self.send_response(200)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a Pannellum multires tile set, rendering tiles from a panorama as they\'re requested. Any other generate.py options that affect the tiles can also be given.',
+                                     allow_abbrev=False)
+    parser.add_argument('--host', dest='host', default='localhost',
+                        help='address to listen on')
+    parser.add_argument('--port', dest='port', default=8000, type=int,
+                        help='port to listen on')
+    parser.add_argument('--region-cache', dest='regionCache', default=256, type=int,
+                        help='size in MiB of the cache of rendered rows of tiles')
+    parser.add_argument('--tile-cache', dest='tileCache', default=64, type=int,
+                        help='size in MiB of the cache of encoded tiles')
+    parser.add_argument('--quiet', action='store_true',
+                        help='don\'t log requests')
+    args, options = parser.parse_known_args()
+    generateArgs = generate.parseArgs(options)
+    if generateArgs.remapper != 'builtin':
+        parser.error('the tile server requires the built-in remapper')
+    try:
+        renderer = TileRenderer(generateArgs, args.regionCache * 2**20, args.tileCache * 2**20)
+    except generate.GenerateError as e:
+        parser.error(str(e))
+    server = http.server.ThreadingHTTPServer((args.host, args.port), TileRequestHandler)
+    server.renderer = renderer
+    server.quiet = args.quiet
+    print('Serving tiles of "' + generateArgs.inputFile + '" at http://' + args.host + ':' + str(args.port) + '/config.json')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
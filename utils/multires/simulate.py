@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# simulate.py - Offline multires tile-request simulator for Pannellum
+# Copyright (c) 2014-2025 Matthew Petroff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import json
+import heapq
+import collections
+
+import multires
+
+
+def simulate(tileSet, path, width, height, fps=60, bandwidth=None, latency=0, settle=10):
+    '''
+    Replay a camera path through the viewer's node selection, returning the
+    tile requests in order, whether the view was fully loaded at the end, and
+    the time at which loading finished. Tiles are fetched over a single link
+    with the given bandwidth (in Mbit/s, or unlimited if None) and latency (in
+    seconds), and repeated requests for the same URL are served by the browser
+    cache.
+    '''
+    viewer = multires.Viewer(tileSet, width, height)
+    requests = []
+    arrivals = []  # Heap of arrival time, sequence number, URL, and success
+    fetched = set()
+    linkFree = 0
+    frame = 0
+    idleSince = None
+
+    def fetch(t, node, url, size):
+        '''
+        Record a request, returning when it arrives.
+        '''
+        nonlocal linkFree
+        cached = url in fetched
+        requests.append({'time': round(t, 4), 'level': node.level, 'face': node.side,
+                         'x': node.x, 'y': node.y, 'url': url, 'bytes': size or 0,
+                         'cached': cached, 'missing': size is None})
+        if cached:
+            return t
+        fetched.add(url)
+        arrival = t + latency
+        if bandwidth is not None:
+            linkFree = max(arrival, linkFree) + (size or 0) * 8 / (bandwidth * 1e6)
+            arrival = linkFree
+        return arrival
+
+    while True:
+        t = frame / fps
+        while arrivals and arrivals[0][0] <= t:
+            _, _, url, success = heapq.heappop(arrivals)
+            viewer.textureLoads.append((url, success))
+        node = viewer.render(*path.view(t))
+        if node is not None:
+            arrival = t
+            if tileSet.archivePath is not None and node.level not in tileSet.indexes:
+                # Each level's archive index is loaded once, before its tiles
+                indexUrl = tileSet.archivePath.replace('%l', str(node.level), 1) + '.idx'
+                arrival = fetch(t, node, indexUrl, tileSet.fileSize(indexUrl))
+            source = tileSet.source(node)
+            if source is None:
+                pass  # Tile doesn't exist in the archive, so it isn't requested
+            elif source[0] in viewer.loading:
+                viewer.loading[source[0]].append(node)  # Shared by an identical tile
+            else:
+                url, size = source
+                viewer.loading[url] = [node]
+                arrival = max(arrival, fetch(arrival, node, url, size))
+                heapq.heappush(arrivals, (arrival, len(requests), url, size is not None))
+        idle = node is None and not arrivals and not viewer.textureLoads
+        if idle and idleSince is None:
+            idleSince = t
+        elif not idle:
+            idleSince = None
+        if t >= path.duration and (idle or t >= path.duration + settle):
+            break
+        frame += 1
+    return requests, idle, idleSince, viewer.evicted
+
+
+def summarize(requests):
+    '''
+    Total the requests, and the bytes transferred, overall and by level.
+    '''
+    levels = collections.OrderedDict()
+    total = {'requests': 0, 'transfers': 0, 'bytes': 0}
+    for r in requests:
+        for counts in (total, levels.setdefault(r['level'], {'requests': 0, 'transfers': 0, 'bytes': 0})):
+            counts['requests'] += 1
+            if not r['cached']:
+                counts['transfers'] += 1
+                counts['bytes'] += r['bytes']
+    total['levels'] = collections.OrderedDict(sorted(levels.items()))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the tile requests the Pannellum viewer makes for a multires tile set while following camera paths.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('config', metavar='CONFIG',
+                        help='config.json of the tile set')
+    parser.add_argument('paths', metavar='PATH', nargs='+',
+                        help='JSON camera path, a list of keyframes with a time in seconds and a pitch, yaw, hfov, and roll in degrees, e.g., [{"time": 0, "yaw": 0}, {"time": 4, "yaw": 90, "hfov": 50}]; each path is simulated as a separate session')
+    parser.add_argument('--tiles', dest='tiles', default=None,
+                        help='tile set directory, if it isn\'t the directory of the config.json')
+    parser.add_argument('--scene', dest='scene', default=None,
+                        help='scene ID of a tour config.json; defaults to the first scene')
+    parser.add_argument('--width', dest='width', default=1280, type=int,
+                        help='viewer width in device pixels')
+    parser.add_argument('--height', dest='height', default=720, type=int,
+                        help='viewer height in device pixels')
+    parser.add_argument('--fps', dest='fps', default=60, type=float,
+                        help='frames rendered per second')
+    parser.add_argument('--bandwidth', dest='bandwidth', default=None, type=float,
+                        help='bandwidth in Mbit/s, which is unlimited if not given')
+    parser.add_argument('--latency', dest='latency', default=0, type=float,
+                        help='latency of each request in ms')
+    parser.add_argument('--settle', dest='settle', default=10, type=float,
+                        help='time in seconds to keep rendering after the end of a path for tiles to finish loading')
+    parser.add_argument('--list', action='store_true',
+                        help='list every tile request')
+    parser.add_argument('--json', dest='json', default=None,
+                        help='save the requests and totals of each session as JSON')
+    args = parser.parse_args()
+
+    tileSet = multires.TileSet(args.config, args.tiles, args.scene)
+    print('config.json: ' + str(tileSet.configBytes) + ' bytes')
+    sessions = []
+    for pathFile in args.paths:
+        with open(pathFile) as f:
+            path = multires.CameraPath(json.load(f), tileSet.scene)
+        requests, idle, loaded, evicted = simulate(tileSet, path, args.width, args.height, args.fps,
+                                                   args.bandwidth, args.latency / 1000, args.settle)
+        total = summarize(requests)
+        print(pathFile + ': ' + str(total['requests']) + ' requests, ' + str(total['transfers']) +
+              ' transfers, ' + str(total['bytes']) + ' bytes, ' +
+              ('loaded after ' + str(round(loaded, 2)) + ' s' if idle else 'not fully loaded'))
+        for level, counts in total['levels'].items():
+            print('Level ' + str(level) + ': ' + str(counts['requests']) + ' requests, ' +
+                  str(counts['transfers']) + ' transfers, ' + str(counts['bytes']) + ' bytes')
+        if evicted > 0:
+            print(str(evicted) + ' nodes evicted from the viewer\'s cache')
+        missing = sum(1 for r in requests if r['missing'])
+        if missing > 0:
+            print('Warning: ' + str(missing) + ' requested files don\'t exist')
+        if args.list:
+            for r in requests:
+                print('  %8.3f s  %s  %d bytes%s' % (r['time'], r['url'], r['bytes'],
+                                                     ' (cached)' if r['cached'] else ''))
+        sessions.append({'path': pathFile, 'loaded': round(loaded, 4) if idle else None,
+                         'evicted': evicted, 'totals': total, 'requests': requests})
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': args.config, 'configBytes': tileSet.configBytes,
+                       'width': args.width, 'height': args.height, 'sessions': sessions}, f, indent=2)
+
+if __name__ == '__main__':
+    main()